@@ -0,0 +1,166 @@
+"""Benchmark de arranque de workers: tiempo de importación, primer request y memoria.
+
+Uso (desde la raíz del proyecto):
+
+    python bench/arranque.py --repeticiones 5 --workers 4 --salida arranque.json
+
+Cada repetición es un intérprete nuevo que importa wsgi.py (como un worker de
+gunicorn sin preload) y atiende un primer request. Además se simula el
+preforking de gunicorn (preload_app): un proceso importa la app y crea
+--workers hijos con fork; cada hijo informa la memoria privada que usa después
+de atender requests (lo que no comparte con el master).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Código que corre en el proceso medido. Imprime una línea JSON.
+MEDIR_WORKER = r'''
+import json, sys, time
+inicio = time.perf_counter()
+import wsgi
+importado = time.perf_counter()
+client = wsgi.app.test_client()
+r = client.get('/')
+r.get_data()
+listo = time.perf_counter()
+sys.path.insert(0, 'bench')
+from arranque import memoria
+print(json.dumps({
+    'import_s': importado - inicio,
+    'primer_request_s': listo - importado,
+    'status': r.status_code,
+    'modulos': len(sys.modules),
+    'openpyxl_cargado': 'openpyxl' in sys.modules,
+    **memoria(),
+}))
+'''
+
+MEDIR_PREFORK = r'''
+import json, os, sys
+sys.path.insert(0, 'bench')
+from arranque import memoria
+import wsgi
+maestro = memoria()
+hijos = []
+for _ in range(int(sys.argv[1])):
+    leer, escribir = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(leer)
+        client = wsgi.app.test_client()
+        for ruta in ('/', '/product/1', '/search?q=instrumento'):
+            client.get(ruta).get_data()
+        os.write(escribir, json.dumps(memoria()).encode())
+        os._exit(0)
+    os.close(escribir)
+    hijos.append((pid, leer))
+resultados = []
+for pid, leer in hijos:
+    with os.fdopen(leer) as f:
+        resultados.append(json.loads(f.read()))
+    os.waitpid(pid, 0)
+print(json.dumps({'maestro': maestro, 'workers': resultados}))
+'''
+
+def memoria():
+    """RSS y memoria privada (no compartida) del proceso actual en MB. Solo Linux."""
+    datos = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for linea in f:
+                partes = linea.split()
+                if partes[0] in ('Rss:', 'Private_Clean:', 'Private_Dirty:'):
+                    datos[partes[0][:-1]] = int(partes[1]) / 1024
+    except OSError:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {'rss_mb': round(rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024, 1)}
+    return {
+        'rss_mb': round(datos.get('Rss', 0), 1),
+        'privada_mb': round(datos.get('Private_Clean', 0) + datos.get('Private_Dirty', 0), 1),
+    }
+
+def _correr(codigo, *args):
+    inicio = time.perf_counter()
+    salida = subprocess.run([sys.executable, '-c', codigo, *args], cwd=RAIZ, env=os.environ,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(salida.strip().splitlines()[-1]), time.perf_counter() - inicio
+
+def _mediana(filas, campo, decimales=3):
+    valores = [f[campo] for f in filas if f.get(campo) is not None]
+    return round(statistics.median(valores), decimales) if valores else None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='URI de la base (por defecto un SQLite temporal)')
+    parser.add_argument('--productos', type=int, default=500)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4, help='hijos en la simulación de preforking')
+    parser.add_argument('--salida', help='archivo JSON de salida (por defecto stdout)')
+    args = parser.parse_args(argv)
+
+    if not args.db:
+        tmpdir = tempfile.mkdtemp(prefix='melodias-arranque-')
+        args.db = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    os.environ['DATABASE_URL'] = args.db
+    os.environ.setdefault('SLOW_QUERY_MS', '100000')
+    # wsgi.py no arranca sin una SECRET_KEY propia
+    os.environ.setdefault('SECRET_KEY', 'bench-arranque')
+
+    # El seed corre en este proceso; las mediciones, en intérpretes nuevos
+    from app import app
+    from bench.seed import seed
+    with app.app_context():
+        seed(usuarios=10, productos=args.productos, pedidos=0)
+
+    frios = []
+    for _ in range(args.repeticiones):
+        datos, total = _correr(MEDIR_WORKER)
+        datos['proceso_s'] = total
+        frios.append(datos)
+        print(f"worker: import {datos['import_s'] * 1000:.0f} ms, primer request "
+              f"{datos['primer_request_s'] * 1000:.0f} ms, RSS {datos['rss_mb']} MB", file=sys.stderr)
+
+    prefork = None
+    if hasattr(os, 'fork'):
+        prefork, _ = _correr(MEDIR_PREFORK, str(args.workers))
+
+    salida = {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'worker_sin_preload': {
+            'repeticiones': len(frios),
+            'proceso_s': _mediana(frios, 'proceso_s'),
+            'import_s': _mediana(frios, 'import_s'),
+            'primer_request_s': _mediana(frios, 'primer_request_s'),
+            'rss_mb': _mediana(frios, 'rss_mb', 1),
+            'privada_mb': _mediana(frios, 'privada_mb', 1),
+            'modulos': frios[0]['modulos'],
+            'openpyxl_cargado': frios[0]['openpyxl_cargado'],
+        },
+        'prefork': prefork and {
+            'maestro': prefork['maestro'],
+            'workers': len(prefork['workers']),
+            'privada_por_worker_mb': _mediana(prefork['workers'], 'privada_mb', 1),
+            'rss_por_worker_mb': _mediana(prefork['workers'], 'rss_mb', 1),
+        },
+    }
+    texto = json.dumps(salida, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            f.write(texto + '\n')
+    else:
+        print(texto)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
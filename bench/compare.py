@@ -0,0 +1,36 @@
+"""Compara dos salidas de bench/run.py.
+
+    python bench/compare.py antes.json despues.json
+"""
+import json
+import sys
+
+METRICAS = ('p50_ms', 'p99_ms', 'throughput_rps', 'consultas_por_request')
+
+def cambio(antes, despues):
+    if antes in (None, 0) or despues is None:
+        return ''
+    return f'{(despues - antes) / antes * 100:+.1f}%'
+
+def main(argv=None):
+    argv = argv if argv is not None else sys.argv[1:]
+    if len(argv) != 2:
+        print(__doc__, file=sys.stderr)
+        return 2
+    with open(argv[0]) as f:
+        antes = json.load(f)
+    with open(argv[1]) as f:
+        despues = json.load(f)
+
+    print(f"{antes.get('commit')} -> {despues.get('commit')}")
+    for escenario, niveles in despues['resultados'].items():
+        for nivel, valores in niveles.items():
+            base = antes['resultados'].get(escenario, {}).get(nivel)
+            if not base:
+                continue
+            partes = [f'{m}={valores[m]} ({cambio(base[m], valores[m])})' for m in METRICAS]
+            print(f'{escenario:>22} {nivel:>4}  ' + '  '.join(partes))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,382 @@
+"""Benchmark de las rutas principales de la tienda y del panel de administración.
+
+Uso (desde la raíz del proyecto):
+
+    python bench/run.py --pedidos 20000 --requests 200 --concurrencia 1 4 --salida bench.json
+
+Crea una base SQLite nueva (o usa --db con cualquier URI compatible), la llena
+con bench/seed.py y recorre cada escenario con el cliente de pruebas de Flask.
+Con --replica copia las rutas de solo lectura leen de una copia del SQLite.
+Con --flood N se mide la latencia de la tienda mientras N hilos prueban
+contraseñas en /login, sin y con límite de intentos y pool de hashing.
+El resultado es JSON con percentiles de latencia, throughput y consultas SQL
+por request, para comparar entre commits con bench/compare.py.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    k = (len(ordenados) - 1) * p / 100
+    i = int(k)
+    j = min(i + 1, len(ordenados) - 1)
+    return ordenados[i] + (ordenados[j] - ordenados[i]) * (k - i)
+
+def resumen(latencias, consultas, duracion, errores):
+    ms = [x * 1000 for x in latencias]
+    return {
+        'requests': len(latencias),
+        'errores': errores,
+        'p50_ms': round(percentil(ms, 50), 3),
+        'p90_ms': round(percentil(ms, 90), 3),
+        'p99_ms': round(percentil(ms, 99), 3),
+        'max_ms': round(max(ms), 3),
+        'media_ms': round(sum(ms) / len(ms), 3),
+        'throughput_rps': round(len(latencias) / duracion, 2) if duracion else None,
+        'consultas_por_request': round(sum(consultas) / len(consultas), 2) if consultas else None,
+    }
+
+def login(app, email, password):
+    client = app.test_client()
+    r = client.post('/login', data={'email': email, 'password': password})
+    if r.status_code != 302:
+        raise RuntimeError(f'No se pudo iniciar sesión como {email}')
+    return client
+
+# --- ESCENARIOS ---
+# Cada escenario recibe (client, rnd, datos) y devuelve la respuesta medida.
+# setup(client, rnd, datos) opcional se ejecuta antes y no se cronometra.
+
+def _agregar_uno(client, rnd, datos):
+    client.post(f"/add_to_cart/{rnd.choice(datos['product_ids'])}", data={'quantity': 1})
+
+def _etag_index(client, rnd, datos):
+    if not hasattr(client, 'etag_index'):
+        client.etag_index = client.get('/').headers.get('ETag')
+
+def _checkout(client, rnd, datos):
+    return client.post('/checkout', data={'payment_method_id': '1'})
+
+ESCENARIOS = {
+    'index': ('anonimo', None, lambda c, rnd, d: c.get('/')),
+    'index_revalidado': ('anonimo', _etag_index, lambda c, rnd, d: c.get('/', headers={'If-None-Match': c.etag_index})),
+    'product_detail': ('anonimo', None, lambda c, rnd, d: c.get(f"/product/{rnd.choice(d['product_ids'])}")),
+    'search': ('anonimo', None, lambda c, rnd, d: c.get(f"/search?q=instrumento+{rnd.randint(1, 99)}")),
+    'add_to_cart': ('cliente', None, lambda c, rnd, d: c.post(f"/add_to_cart/{rnd.choice(d['product_ids'])}",
+                                                                data={'quantity': 1})),
+    'view_cart': ('cliente', _agregar_uno, lambda c, rnd, d: c.get('/cart')),
+    'checkout': ('cliente', _agregar_uno, _checkout),
+    'profile': ('cliente', None, lambda c, rnd, d: c.get('/profile')),
+    'admin_dashboard': ('admin', None, lambda c, rnd, d: c.get('/admin')),
+    'download_report': ('admin', None, lambda c, rnd, d: c.get('/admin/report')),
+    'download_report_csv': ('admin', None, lambda c, rnd, d: c.get('/admin/report?formato=csv')),
+}
+
+def correr_escenario(app, datos, nombre, total, concurrencia, password):
+    rol, setup, accion = ESCENARIOS[nombre]
+    latencias, consultas = [], []
+    errores = 0
+    lock = threading.Lock()
+    por_hilo = max(total // concurrencia, 1)
+
+    # Los logins se hacen antes de cronometrar para no medir el hash de la contraseña
+    clientes = []
+    for n in range(concurrencia):
+        if rol == 'anonimo':
+            clientes.append(app.test_client())
+        elif rol == 'admin':
+            clientes.append(login(app, datos['admin'], password))
+        else:
+            clientes.append(login(app, datos['clientes'][n % len(datos['clientes'])], password))
+
+    def hilo(n):
+        nonlocal errores
+        rnd = random.Random(n)
+        client = clientes[n]
+        for _ in range(por_hilo):
+            if setup:
+                setup(client, rnd, datos)
+            inicio = time.perf_counter()
+            r = accion(client, rnd, datos)
+            r.get_data()
+            fin = time.perf_counter() - inicio
+            m = QUERIES_RE.search(r.headers.get('Server-Timing', ''))
+            with lock:
+                latencias.append(fin)
+                if m:
+                    consultas.append(int(m.group(1)))
+                if r.status_code >= 400:
+                    errores += 1
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        list(pool.map(hilo, range(concurrencia)))
+    return resumen(latencias, consultas, time.perf_counter() - inicio, errores)
+
+def prueba_sobreventa(app, datos, compradores, stock, password):
+    """Muchos checkouts simultáneos del mismo producto: nunca debe venderse más que el stock.
+
+    Corre sin reservas: con ellas los que no alcanzan se quedan afuera al
+    agregar y la carrera del checkout (el UPDATE condicional) no se prueba.
+    """
+    from models import db, Product, OrderItem
+    product_id = datos['product_ids'][0]
+    minutos_original = app.config['RESERVA_MINUTOS']
+    app.config['RESERVA_MINUTOS'] = 0
+    with app.app_context():
+        db.session.execute(db.update(Product).where(Product.id == product_id).values(stock=stock))
+        db.session.commit()
+        vendidos_antes = db.session.query(db.func.coalesce(db.func.sum(OrderItem.quantity), 0)) \
+            .filter(OrderItem.product_id == product_id).scalar()
+
+    clientes = [login(app, datos['clientes'][i % len(datos['clientes'])], password) for i in range(compradores)]
+    for client in clientes:
+        client.post(f'/add_to_cart/{product_id}', data={'quantity': 1})
+    barrera = threading.Barrier(compradores)
+
+    def comprar(client):
+        barrera.wait()
+        return client.post('/checkout', data={'payment_method_id': '1'}).status_code
+
+    with ThreadPoolExecutor(max_workers=compradores) as pool:
+        list(pool.map(comprar, clientes))
+    app.config['RESERVA_MINUTOS'] = minutos_original
+
+    with app.app_context():
+        stock_final = db.session.get(Product, product_id).stock
+        vendidos = db.session.query(db.func.coalesce(db.func.sum(OrderItem.quantity), 0)) \
+            .filter(OrderItem.product_id == product_id).scalar() - vendidos_antes
+    return {
+        'compradores': compradores,
+        'stock_inicial': stock,
+        'vendidos': int(vendidos),
+        'stock_final': stock_final,
+        'ok': stock_final >= 0 and vendidos + stock_final == stock,
+    }
+
+def prueba_reservas(app, datos, niveles, stock, password):
+    """Venta relámpago: N compradores agregan 1 unidad del mismo producto y pagan.
+
+    Se corre con y sin reservas (RESERVA_MINUTOS) para cada N. Con reservas los
+    que no alcanzan se enteran al agregar y el checkout no falla; sin reservas
+    todos agregan y la competencia se resuelve en el checkout.
+    """
+    from models import db, Product, StockReservation
+    product_id = datos['product_ids'][1]
+    clientes = [login(app, datos['clientes'][i % len(datos['clientes'])], password) for i in range(max(niveles))]
+    minutos_original = app.config['RESERVA_MINUTOS']
+    resultados = {}
+    for modo, minutos in (('con_reservas', minutos_original or 15), ('sin_reservas', 0)):
+        app.config['RESERVA_MINUTOS'] = minutos
+        resultados[modo] = {}
+        for n in niveles:
+            with app.app_context():
+                db.session.execute(db.delete(StockReservation))
+                db.session.execute(db.update(Product).where(Product.id == product_id).values(stock=stock, reservado=0))
+                db.session.commit()
+            for client in clientes[:n]:
+                client.get(f'/remove_from_cart/{product_id}')
+            barrera = threading.Barrier(n)
+
+            def comprar(client):
+                barrera.wait()
+                inicio = time.perf_counter()
+                r = client.post(f'/add_to_cart/{product_id}', data={'quantity': 1})
+                agregar = time.perf_counter() - inicio
+                if r.status_code != 302 or 'product' in r.location:
+                    return agregar, None, r.status_code >= 500 and 'error' or 'sin_stock'
+                inicio = time.perf_counter()
+                r = client.post('/checkout', data={'payment_method_id': '1'})
+                pagar = time.perf_counter() - inicio
+                return agregar, pagar, 'vendido' if r.status_code == 200 else 'fallo_checkout'
+
+            with ThreadPoolExecutor(max_workers=n) as pool:
+                filas = list(pool.map(comprar, clientes[:n]))
+            with app.app_context():
+                stock_final = db.session.get(Product, product_id).stock
+            agregar = [f[0] * 1000 for f in filas]
+            pagar = [f[1] * 1000 for f in filas if f[1] is not None]
+            conteo = {k: sum(f[2] == k for f in filas) for k in ('vendido', 'sin_stock', 'fallo_checkout', 'error')}
+            resultados[modo][f'c{n}'] = {
+                **conteo,
+                'stock_final': stock_final,
+                'ok': stock_final == stock - conteo['vendido'] >= 0,
+                'agregar_p50_ms': round(percentil(agregar, 50), 3),
+                'agregar_p99_ms': round(percentil(agregar, 99), 3),
+                'checkout_p50_ms': round(percentil(pagar, 50), 3) if pagar else None,
+                'checkout_p99_ms': round(percentil(pagar, 99), 3) if pagar else None,
+            }
+            print(f'{"reservas " + modo:>22} c{n}: {resultados[modo][f"c{n}"]}', file=sys.stderr)
+    app.config['RESERVA_MINUTOS'] = minutos_original
+    return resultados
+
+def prueba_login_flood(app, datos, atacantes, segundos, password):
+    """Latencia de la tienda (anónima) mientras `atacantes` hilos prueban
+    contraseñas incorrectas contra la misma cuenta, cada uno desde su IP.
+
+    Modos: sin ataque (referencia), ataque sin límites, ataque con límite de
+    intentos y ataque con límite más el pool de procesos de hashing.
+    """
+    from limites import MemoriaBuckets
+    original = {clave: app.config[clave] for clave in ('THROTTLE_ACTIVO', 'PASSWORD_HASH_WORKERS')}
+    modos = (
+        ('sin_ataque', 0, {'THROTTLE_ACTIVO': False}),
+        ('ataque_sin_limites', atacantes, {'THROTTLE_ACTIVO': False}),
+        ('ataque_con_limites', atacantes, {'THROTTLE_ACTIVO': True}),
+        ('ataque_con_limites_y_pool', atacantes, {'THROTTLE_ACTIVO': True, 'PASSWORD_HASH_WORKERS': 2}),
+    )
+    backend = app.extensions['limitador']
+    resultados = {}
+    for modo, hilos, config in modos:
+        app.config.update(original, **config)
+        if isinstance(backend, MemoriaBuckets):
+            app.extensions['limitador'] = MemoriaBuckets()
+        fin = time.perf_counter() + segundos
+        estados = []
+
+        def atacar(n):
+            client = app.test_client()
+            ip = f'10.0.{n // 250}.{n % 250 + 1}'
+            while time.perf_counter() < fin:
+                r = client.post('/login', data={'email': datos['clientes'][0], 'password': password + 'x'},
+                                environ_base={'REMOTE_ADDR': ip})
+                estados.append(r.status_code)
+
+        def tienda():
+            client = app.test_client()
+            rnd = random.Random(0)
+            latencias = []
+            errores = 0
+            while time.perf_counter() < fin:
+                ruta = '/' if rnd.random() < 0.5 else f"/product/{rnd.choice(datos['product_ids'])}"
+                inicio = time.perf_counter()
+                r = client.get(ruta)
+                r.get_data()
+                latencias.append(time.perf_counter() - inicio)
+                errores += r.status_code >= 400
+            return latencias, errores
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos + 1) as pool:
+            medicion = pool.submit(tienda)
+            for n in range(hilos):
+                pool.submit(atacar, n)
+            latencias, errores = medicion.result()
+        resultados[modo] = {
+            'tienda': resumen(latencias, [], time.perf_counter() - inicio, errores),
+            'intentos_login': len(estados),
+            'rechazados_429': estados.count(429),
+            'rechazados_503': estados.count(503),
+        }
+        print(f'{"login " + modo:>30}: {resultados[modo]}', file=sys.stderr)
+    app.config.update(original)
+    app.extensions['limitador'] = backend
+    return resultados
+
+def commit_actual():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='URI de la base (por defecto un SQLite temporal)')
+    parser.add_argument('--usuarios', type=int, default=200)
+    parser.add_argument('--productos', type=int, default=500)
+    parser.add_argument('--pedidos', type=int, default=5000)
+    parser.add_argument('--items-por-pedido', type=int, default=3)
+    parser.add_argument('--requests', type=int, default=100, help='requests por escenario y nivel de concurrencia')
+    parser.add_argument('--concurrencia', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--escenarios', nargs='+', choices=sorted(ESCENARIOS), default=list(ESCENARIOS))
+    parser.add_argument('--compradores', type=int, default=20, help='checkouts simultáneos en la prueba de sobreventa')
+    parser.add_argument('--flash', type=int, nargs='+', default=[10, 40],
+                        help='compradores simultáneos en la prueba de reservas (stock = 20)')
+    parser.add_argument('--flood', type=int, default=8, help='hilos atacantes en la prueba de login (0 = no correrla)')
+    parser.add_argument('--flood-segundos', type=float, default=5, help='duración de cada modo de la prueba de login')
+    parser.add_argument('--replica', help="URI de la réplica de lectura, o 'copia' para usar una copia "
+                                          "del SQLite del benchmark hecha después del seed")
+    parser.add_argument('--salida', help='archivo JSON de salida (por defecto stdout)')
+    args = parser.parse_args(argv)
+
+    tmpdir = None
+    if not args.db:
+        tmpdir = tempfile.mkdtemp(prefix='melodias-bench-')
+        args.db = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    os.environ['DATABASE_URL'] = args.db
+    copia = None
+    if args.replica == 'copia':
+        if not args.db.startswith('sqlite:///'):
+            parser.error("--replica copia solo funciona con SQLite")
+        copia = args.db[len('sqlite:///'):] + '.replica'
+        args.replica = f'sqlite:///{copia}'
+    if args.replica:
+        os.environ['DATABASE_REPLICA_URL'] = args.replica
+    os.environ.setdefault('SLOW_QUERY_MS', '100000')
+    # Las consultas por request se leen de la cabecera Server-Timing
+    os.environ.setdefault('MELODIAS_SERVER_TIMING', 'true')
+
+    from app import app
+    from models import db
+    from bench.seed import seed, BENCH_PASSWORD
+
+    with app.app_context():
+        inicio = time.perf_counter()
+        datos = seed(args.usuarios, args.productos, args.pedidos, args.items_por_pedido)
+        tiempo_seed = time.perf_counter() - inicio
+    if copia:
+        shutil.copyfile(args.db[len('sqlite:///'):], copia)
+    # Todos los logins del benchmark salen de la misma IP: el límite de
+    # intentos solo se activa en la prueba de login. Los escenarios agregan
+    # al mismo carrito miles de veces: sin tope de unidades.
+    app.config.update(THROTTLE_ACTIVO=False, CARRITO_MAX_POR_PRODUCTO=10**9, CARRITO_MAX_UNIDADES=10**9)
+
+    resultados = {}
+    for nombre in args.escenarios:
+        resultados[nombre] = {}
+        for concurrencia in args.concurrencia:
+            resultados[nombre][f'c{concurrencia}'] = correr_escenario(
+                app, datos, nombre, args.requests, concurrencia, BENCH_PASSWORD)
+            print(f'{nombre:>22} c{concurrencia}: {resultados[nombre][f"c{concurrencia}"]}', file=sys.stderr)
+
+    salida = {
+        'commit': commit_actual(),
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'db': app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1],
+        'volumen': {'usuarios': args.usuarios, 'productos': args.productos,
+                    'pedidos': args.pedidos, 'items_por_pedido': args.items_por_pedido},
+        'replica': args.replica.split('@')[-1] if args.replica else None,
+        'seed_s': round(tiempo_seed, 2),
+        'resultados': resultados,
+        'sobreventa': prueba_sobreventa(app, datos, args.compradores, args.compradores // 2, BENCH_PASSWORD),
+        'reservas': prueba_reservas(app, datos, args.flash, 20, BENCH_PASSWORD) if args.flash else None,
+        'login_flood': prueba_login_flood(app, datos, args.flood, args.flood_segundos, BENCH_PASSWORD) if args.flood else None,
+    }
+    texto = json.dumps(salida, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            f.write(texto + '\n')
+    else:
+        print(texto)
+    reservas_ok = all(r['ok'] for modo in (salida['reservas'] or {}).values() for r in modo.values())
+    return 0 if salida['sobreventa']['ok'] and reservas_ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import insert, update, select, func
+from models import db, User, Product, Order, OrderItem, PaymentMethod, Courier
+import ventas
+import inventario
+import contrasenas
+
+BENCH_PASSWORD = 'bench12345'
+ESTADOS = ['Pendiente de envío', 'Enviado', 'Entregado', 'Cancelado']
+
+def _lotes(filas, tamano=5000):
+    for i in range(0, len(filas), tamano):
+        yield filas[i:i + tamano]
+
+def seed(usuarios=200, productos=500, pedidos=5000, items_por_pedido=3, stock=1000, semilla=42):
+    """Crea una base nueva con volúmenes configurables. Devuelve los emails de login.
+
+    Todas las filas se insertan con executemany en lotes; el hash de la
+    contraseña se calcula una sola vez y se comparte.
+    """
+    rnd = random.Random(semilla)
+    db.drop_all()
+    db.create_all()
+    password = contrasenas.generar(BENCH_PASSWORD)
+
+    filas = [{'nombre': 'Admin', 'apellido': 'Bench', 'email': 'admin@bench.local',
+              'password': password, 'role': 'admin', 'is_active': True}]
+    filas += [{'nombre': f'Cliente{i}', 'apellido': 'Bench', 'email': f'cliente{i}@bench.local',
+               'password': password, 'direccion': f'Calle {i}', 'telefono': '555-0000',
+               'role': 'cliente', 'is_active': True} for i in range(usuarios)]
+    for lote in _lotes(filas):
+        db.session.execute(insert(User), lote)
+
+    filas = [{'nombre': f'Instrumento {i}', 'descripcion': f'Instrumento musical de prueba número {i}',
+              'precio': Decimal(rnd.randint(50, 5000)), 'stock': stock, 'imagen': 'guitarra.jpg'}
+             for i in range(productos)]
+    for lote in _lotes(filas):
+        db.session.execute(insert(Product), lote)
+
+    db.session.execute(insert(Courier), [{'name': n} for n in ('DHL', 'FedEx', 'Estafeta')])
+
+    clientes = [u.id for u in User.query.filter_by(role='cliente')]
+    db.session.execute(insert(PaymentMethod), [
+        {'user_id': uid, 'card_type': 'Visa', 'card_holder': 'Bench', 'masked_number': '**** **** **** 4242'}
+        for uid in clientes
+    ])
+
+    product_ids = [p.id for p in Product.query.with_entities(Product.id)]
+    precios = dict(Product.query.with_entities(Product.id, Product.precio))
+    inicio = datetime.utcnow() - timedelta(days=365)
+    for lote in _lotes(range(pedidos), 2000):
+        ordenes = [{'user_id': rnd.choice(clientes), 'total': 0, 'status': rnd.choice(ESTADOS),
+                    'date': inicio + timedelta(minutes=rnd.randint(0, 525600))} for _ in lote]
+        db.session.execute(insert(Order), ordenes)
+    order_ids = [o.id for o in Order.query.with_entities(Order.id)]
+    items = []
+    for order_id in order_ids:
+        for product_id in rnd.sample(product_ids, min(items_por_pedido, len(product_ids))):
+            items.append({'order_id': order_id, 'product_id': product_id, 'product_name': f'Instrumento {product_id}',
+                          'quantity': rnd.randint(1, 3), 'price': precios[product_id]})
+    for lote in _lotes(items):
+        db.session.execute(insert(OrderItem), lote)
+    db.session.execute(update(Order).values(total=select(func.sum(OrderItem.price * OrderItem.quantity))
+                                            .where(OrderItem.order_id == Order.id).scalar_subquery()))
+    db.session.commit()
+    ventas.reconstruir()
+    inventario.conciliar(saldo_inicial=True)
+
+    return {
+        'admin': 'admin@bench.local',
+        'clientes': [f'cliente{i}@bench.local' for i in range(usuarios)],
+        'product_ids': product_ids,
+    }
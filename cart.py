@@ -0,0 +1,100 @@
+from flask import session, current_app
+from flask_login import current_user
+import secrets
+from collections import Counter
+from models import db, CartItem
+
+# El carrito vive en la sesión como {"<product_id>": cantidad}. Las claves son
+# texto porque la cookie se serializa como JSON. Si CART_SERVER_SIDE está
+# activo, cada cambio también se guarda en CartItem para el usuario logueado.
+
+def _server_side():
+    return current_app.config.get('CART_SERVER_SIDE') and current_user.is_authenticated
+
+def _session_cart():
+    """Diccionario del carrito dentro de la sesión, convirtiendo el formato
+    anterior (lista con un id por unidad) la primera vez que se lee."""
+    raw = session.get('cart')
+    if isinstance(raw, list):
+        raw = {str(product_id): qty for product_id, qty in Counter(raw).items()}
+        session['cart'] = raw
+    elif not raw:
+        raw = {}
+        session['cart'] = raw
+    return raw
+
+def get_cart():
+    """Devuelve el carrito como {product_id: cantidad}."""
+    if not session.get('cart'):
+        return {}
+    return {int(product_id): qty for product_id, qty in _session_cart().items()}
+
+def reservation_key(create=False):
+    """Identificador del carrito para las reservas de stock (reservas.py).
+
+    Se crea recién al apartar algo, así quien solo navega no recibe cookie.
+    """
+    key = session.get('reserva')
+    if key is None and create:
+        key = session['reserva'] = secrets.token_hex(16)
+    return key
+
+def units():
+    """Total de unidades en el carrito (para el contador del menú)."""
+    raw = session.get('cart')
+    if not raw:
+        return 0
+    if isinstance(raw, list):
+        return len(raw)
+    return sum(raw.values())
+
+def quantity(product_id):
+    if not session.get('cart'):
+        return 0
+    return _session_cart().get(str(product_id), 0)
+
+def set_quantity(product_id, quantity):
+    raw = _session_cart()
+    if quantity > 0:
+        raw[str(product_id)] = quantity
+    else:
+        raw.pop(str(product_id), None)
+    session.modified = True
+    if _server_side():
+        if quantity > 0:
+            db.session.merge(CartItem(user_id=current_user.id, product_id=product_id, quantity=quantity))
+        else:
+            CartItem.query.filter_by(user_id=current_user.id, product_id=product_id).delete()
+        db.session.commit()
+
+def add(product_id, qty):
+    set_quantity(product_id, quantity(product_id) + qty)
+
+def remove(product_id):
+    set_quantity(product_id, 0)
+
+def clear():
+    session.pop('cart', None)
+    if _server_side():
+        CartItem.query.filter_by(user_id=current_user.id).delete()
+        db.session.commit()
+
+def merge_on_login(user):
+    """Une el carrito de la sesión con el guardado del usuario al iniciar sesión."""
+    if not current_app.config.get('CART_SERVER_SIDE'):
+        session.pop('cart', None)
+        return
+    guardado = {item.product_id: item for item in CartItem.query.filter_by(user_id=user.id)}
+    for product_id, qty in get_cart().items():
+        if product_id in guardado:
+            guardado[product_id].quantity += qty
+        else:
+            guardado[product_id] = CartItem(user_id=user.id, product_id=product_id, quantity=qty)
+            db.session.add(guardado[product_id])
+    session['cart'] = {str(product_id): item.quantity for product_id, item in guardado.items()}
+    db.session.commit()
+
+def forget_on_logout():
+    """Con carrito en servidor, la copia de la sesión no debe quedar en el navegador."""
+    if current_app.config.get('CART_SERVER_SIDE'):
+        session.pop('cart', None)
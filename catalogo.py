@@ -0,0 +1,55 @@
+import random
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, insert, delete, func
+from models import db, Product, CatalogChange
+
+# Versión del catálogo para las cachés de todos los workers. Cada escritura que
+# cambia lo que muestran las páginas públicas o la búsqueda (altas, ediciones,
+# bajas, importación, stock de checkout y cancelaciones) llama a
+# registrar_cambio antes de su commit: las filas entran en la misma transacción.
+# El id de la última fila es la versión; se lee por llave primaria, sin
+# recorrer productos.
+#
+# Es un registro y no un contador en una fila: dos compras simultáneas solo
+# agregan filas y no esperan el bloqueo de una fila compartida, y quien tenga
+# una versión vieja puede pedir solo los productos que cambiaron desde ella.
+
+def registrar_cambio(product_ids=None):
+    """Anota el cambio en la transacción actual (sin commit). None = cambio masivo."""
+    ahora = datetime.utcnow()
+    if product_ids is None:
+        filas = [{'product_id': None, 'fecha': ahora}]
+    else:
+        filas = [{'product_id': product_id, 'fecha': ahora} for product_id in sorted(set(product_ids))]
+    if not filas:
+        return
+    db.session.execute(insert(CatalogChange), filas)
+    # Limpieza ocasional: las filas nuevas tienen fecha actual, así la última
+    # (la versión) nunca se borra
+    if random.random() < 0.01:
+        corte = ahora - timedelta(days=current_app.config['CATALOG_CHANGES_DIAS'])
+        db.session.execute(delete(CatalogChange).where(CatalogChange.fecha < corte)
+                           .execution_options(synchronize_session=False))
+
+def version():
+    """(id, fecha) del último cambio. Sin cambios registrados todavía (base
+    recién migrada) la versión es 0 con la última modificación de productos."""
+    fila = db.session.execute(
+        select(CatalogChange.id, CatalogChange.fecha).order_by(CatalogChange.id.desc()).limit(1)
+    ).first()
+    if fila is None:
+        return 0, db.session.scalar(select(func.max(Product.updated_at)))
+    return tuple(fila)
+
+def cambios_desde(desde, hasta):
+    """Ids de los productos que cambiaron entre las versiones `desde` (excluida) y
+    `hasta`. None si hay que recargar todo: hubo un cambio masivo o las filas
+    de ese tramo ya se limpiaron."""
+    primero = db.session.scalar(select(func.min(CatalogChange.id)))
+    if primero is None or primero > desde + 1:
+        return None
+    ids = set(db.session.scalars(
+        select(CatalogChange.product_id).where(CatalogChange.id > desde, CatalogChange.id <= hasta)
+    ))
+    return None if None in ids else ids
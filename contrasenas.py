@@ -0,0 +1,68 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Hash de contraseñas con el método de PASSWORD_HASH_METHOD (ej.
+# 'scrypt:32768:8:1' o 'pbkdf2:sha256:1000000'). Con PASSWORD_HASH_WORKERS > 0
+# el cálculo corre en un pool de procesos acotado: una ráfaga de logins usa a
+# lo sumo esos núcleos y el resto queda para la tienda. Si la cola del pool
+# está llena se lanza Ocupado en vez de acumular requests esperando.
+
+class Ocupado(Exception):
+    """El pool de hashing no tiene lugar; conviene responder 503 y reintentar."""
+
+_pool = {'pid': None, 'workers': 0, 'executor': None, 'cupos': None}
+_pool_lock = threading.Lock()
+_prefijos = {}
+
+def generar(password):
+    config = current_app.config
+    return _correr(generate_password_hash, password, config['PASSWORD_HASH_METHOD'], config['PASSWORD_SALT_LENGTH'])
+
+def verificar(hash_guardado, password):
+    return _correr(check_password_hash, hash_guardado, password)
+
+def necesita_rehash(hash_guardado):
+    """True si el hash se generó con otro método o costo que el configurado."""
+    return hash_guardado.split('$', 1)[0] != _prefijo(current_app.config['PASSWORD_HASH_METHOD'])
+
+def _prefijo(metodo):
+    # werkzeug completa los parámetros que faltan ('pbkdf2' -> 'pbkdf2:sha256:1000000');
+    # la forma completa se obtiene una vez por método con un hash de prueba
+    if metodo not in _prefijos:
+        _prefijos[metodo] = generate_password_hash('', metodo).split('$', 1)[0]
+    return _prefijos[metodo]
+
+def _correr(funcion, *args):
+    workers = current_app.config['PASSWORD_HASH_WORKERS']
+    if not workers:
+        return funcion(*args)
+    executor, cupos = _executor(workers)
+    if not cupos.acquire(timeout=current_app.config['PASSWORD_HASH_TIMEOUT']):
+        raise Ocupado()
+    try:
+        return executor.submit(funcion, *args).result()
+    finally:
+        cupos.release()
+
+def _contexto():
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+
+def _executor(workers):
+    # Un pool por proceso: con gunicorn y preload cada worker crea el suyo
+    # al primer login (los procesos del pool no sobreviven al fork del master).
+    # forkserver y no fork: el worker ya tiene hilos (gthread, barrido de
+    # reservas, imágenes) y un fork podría copiar un lock tomado por otro hilo.
+    if _pool['pid'] != os.getpid() or _pool['workers'] != workers:
+        with _pool_lock:
+            if _pool['pid'] != os.getpid() or _pool['workers'] != workers:
+                if _pool['executor'] is not None and _pool['pid'] == os.getpid():
+                    _pool['executor'].shutdown(wait=False)
+                _pool.update(pid=os.getpid(), workers=workers,
+                             executor=ProcessPoolExecutor(max_workers=workers, mp_context=_contexto()),
+                             cupos=threading.BoundedSemaphore(workers * current_app.config['PASSWORD_HASH_QUEUE']))
+    return _pool['executor'], _pool['cupos']
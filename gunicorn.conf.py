@@ -0,0 +1,32 @@
+import multiprocessing
+import os
+
+# Configuración de gunicorn para la tienda: gunicorn -c gunicorn.conf.py wsgi:app
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Con hilos (gthread) cada worker atiende varios requests y comparte sus cachés
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# La app se importa una vez en el master y los workers la heredan al hacer
+# fork: arrancan más rápido y comparten la memoria de los módulos (copy-on-write).
+preload_app = True
+# Reciclar workers de a poco acota el crecimiento de memoria de cachés e índices
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+def post_fork(server, worker):
+    # Las conexiones que el master haya abierto no se pueden compartir entre
+    # procesos: cada worker abre las suyas (close=False no cierra las del padre).
+    from app import app
+    from models import db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
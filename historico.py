@@ -0,0 +1,105 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import select, insert, delete, func, literal
+from models import db, Order, OrderItem, OrderArchive, OrderItemArchive
+from schema import soporta_skip_locked
+
+logger = logging.getLogger('melodias.historico')
+
+# Archivo de pedidos: los entregados y cancelados con más de N días pasan de
+# Order/OrderItem a OrderArchive/OrderItemArchive en lotes (INSERT ... SELECT y
+# DELETE en la misma transacción, un commit por lote). Antes del commit cada
+# lote se verifica: el archivo debe tener los mismos pedidos, items, unidades
+# y totales que se leyeron de las tablas vivas, y estas ya no deben tenerlos.
+# Si algo no coincide se hace rollback del lote y se detiene.
+#
+# Los pedidos pendientes y enviados nunca se archivan: checkout, cancelación
+# y cambios de estado siguen trabajando solo con Order.
+
+ESTADOS_ARCHIVABLES = ('Entregado', 'Cancelado')
+
+COLUMNAS_PEDIDO = ('id', 'user_id', 'date', 'status', 'total', 'tracking_number', 'shipping_company')
+COLUMNAS_ITEM = ('id', 'order_id', 'product_id', 'product_name', 'quantity', 'price')
+
+class ArchivoError(Exception):
+    """Un lote no pasó la verificación; se deshizo sin archivar nada."""
+
+def _dinero(valor):
+    return Decimal(str(valor)).quantize(Decimal('0.01'))
+
+def _totales(pedido, item, ids):
+    """(pedidos, suma de totales, items, unidades, suma de cantidad x precio) de los ids."""
+    pedidos, total = db.session.execute(
+        select(func.count(pedido.id), func.coalesce(func.sum(pedido.total), 0)).where(pedido.id.in_(ids))
+    ).one()
+    items, unidades, importe = db.session.execute(
+        select(func.count(item.id), func.coalesce(func.sum(item.quantity), 0),
+               func.coalesce(func.sum(item.quantity * item.price), 0)).where(item.order_id.in_(ids))
+    ).one()
+    return pedidos, _dinero(total), items, int(unidades), _dinero(importe)
+
+def archivar(dias, lote=1000, al_lote=None):
+    """Mueve al archivo los pedidos archivables con más de `dias` días.
+
+    Devuelve {'pedidos', 'items', 'lotes'}. al_lote(resumen) se llama después
+    de cada commit. Lanza ArchivoError si un lote no verifica (los anteriores
+    ya quedaron archivados).
+    """
+    corte = datetime.utcnow() - timedelta(days=dias)
+    # El pedido más nuevo se queda en Order aunque califique: SQLite (sin
+    # AUTOINCREMENT) reutilizaría su id y chocaría con el archivo
+    ultimo = db.session.scalar(select(func.max(Order.id)))
+    # Dos archivadores a la vez se reparten los pedidos con SKIP LOCKED donde el
+    # servidor lo acepta; en MySQL 5.7 / MariaDB < 10.6 el segundo espera
+    saltar = soporta_skip_locked(db.engine)
+    resumen = {'pedidos': 0, 'items': 0, 'lotes': 0}
+    while True:
+        ids = db.session.scalars(
+            select(Order.id)
+            .where(Order.status.in_(ESTADOS_ARCHIVABLES), Order.date < corte, Order.id != ultimo)
+            .order_by(Order.date).limit(lote).with_for_update(skip_locked=saltar)
+        ).all()
+        if not ids:
+            break
+        esperado = _totales(Order, OrderItem, ids)
+        ahora = literal(datetime.utcnow())
+        db.session.execute(insert(OrderArchive).from_select(
+            [*COLUMNAS_PEDIDO, 'archivado'],
+            select(*[getattr(Order, c) for c in COLUMNAS_PEDIDO], ahora).where(Order.id.in_(ids))))
+        db.session.execute(insert(OrderItemArchive).from_select(
+            COLUMNAS_ITEM,
+            select(*[getattr(OrderItem, c) for c in COLUMNAS_ITEM]).where(OrderItem.order_id.in_(ids))))
+        db.session.execute(delete(OrderItem).where(OrderItem.order_id.in_(ids))
+                           .execution_options(synchronize_session=False))
+        db.session.execute(delete(Order).where(Order.id.in_(ids))
+                           .execution_options(synchronize_session=False))
+
+        archivado = _totales(OrderArchive, OrderItemArchive, ids)
+        restantes = _totales(Order, OrderItem, ids)
+        if archivado != esperado or restantes[0] or restantes[2]:
+            db.session.rollback()
+            raise ArchivoError(f'Lote de {len(ids)} pedidos desde #{min(ids)} no verifica: '
+                               f'esperado {esperado}, archivo {archivado}, quedan {restantes}')
+        db.session.commit()
+
+        resumen['pedidos'] += esperado[0]
+        resumen['items'] += esperado[2]
+        resumen['lotes'] += 1
+        logger.info('Lote archivado: %d pedidos, %d items', esperado[0], esperado[2])
+        if al_lote:
+            al_lote(resumen)
+        if len(ids) < lote:
+            break
+    return resumen
+
+def conteo_por_estado(user_id):
+    """{status: pedidos} del cliente sumando Order y el archivo."""
+    conteos = defaultdict(int)
+    for modelo in (Order, OrderArchive):
+        filas = db.session.query(modelo.status, func.count(modelo.id)) \
+            .filter(modelo.user_id == user_id).group_by(modelo.status)
+        for status, cantidad in filas:
+            conteos[status] += cantidad
+    return dict(conteos)
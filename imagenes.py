@@ -0,0 +1,143 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+# Pillow es opcional: sin él las imágenes se guardan igual (con nombre por
+# contenido) pero sin variantes, y las plantillas usan el original.
+# Se importa recién al guardar o procesar una imagen (ver _pillow): cargarlo y
+# probar WebP cuesta ~40 ms por worker y las páginas no lo necesitan.
+
+logger = logging.getLogger('melodias.imagenes')
+
+# Variantes por ancho máximo en píxeles: mini (carrito, admin), tarjeta
+# (catálogo y búsqueda) y detalle (página del producto).
+VARIANTES = {'mini': 160, 'tarjeta': 480, 'detalle': 1024}
+
+# Las variantes se guardan en WebP si Pillow lo soporta, si no en JPEG
+EXTENSIONES_VARIANTE = ('webp', 'jpg')
+
+_HASH_RE = re.compile(r'^[0-9a-f]{16}(-\d+)?\.\w+$')
+_pool = None
+_pil = None
+
+def _pillow():
+    """Módulos de Pillow y formato de las variantes; None si no está instalado."""
+    global _pil
+    if _pil is None:
+        try:
+            from PIL import Image, ImageOps, UnidentifiedImageError, features
+        except ImportError:
+            _pil = False
+        else:
+            webp = features.check('webp')
+            _pil = SimpleNamespace(Image=Image, ImageOps=ImageOps, UnidentifiedImageError=UnidentifiedImageError,
+                                   formato='WEBP' if webp else 'JPEG', extension='webp' if webp else 'jpg')
+    return _pil or None
+
+def disponible():
+    return _pillow() is not None
+
+def extension_variantes():
+    pil = _pillow()
+    return pil.extension if pil else 'jpg'
+
+def es_inmutable(nombre):
+    """Los archivos nombrados por su contenido nunca cambian."""
+    return bool(_HASH_RE.match(os.path.basename(nombre)))
+
+def nombre_variante(nombre, variante, extension=None):
+    base = os.path.splitext(nombre)[0]
+    return f'{base}-{VARIANTES[variante]}.{extension or extension_variantes()}'
+
+def variantes_existentes(carpeta, nombre):
+    """{variante: archivo} de las variantes ya generadas. Las busca en los dos
+    formatos posibles, así las páginas no necesitan cargar Pillow."""
+    encontradas = {}
+    for variante in VARIANTES:
+        for extension in EXTENSIONES_VARIANTE:
+            archivo = nombre_variante(nombre, variante, extension)
+            if os.path.exists(os.path.join(carpeta, archivo)):
+                encontradas[variante] = archivo
+                break
+    return encontradas
+
+def _escribir(ruta, datos):
+    # Archivo temporal + rename: nadie puede leer una imagen a medio escribir
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(datos)
+    os.replace(tmp, ruta)
+
+def guardar(archivo, carpeta):
+    """Guarda el upload como <sha256[:16]>.<ext> y devuelve ese nombre.
+
+    Subir dos veces la misma imagen reutiliza el archivo; una imagen distinta
+    nunca pisa a otra aunque tenga el mismo nombre original.
+    """
+    datos = archivo.read()
+    extension = os.path.splitext(archivo.filename or '')[1].lower() or '.jpg'
+    pil = _pillow()
+    if pil is not None:
+        try:
+            with pil.Image.open(io.BytesIO(datos)) as img:
+                img.verify()
+                extension = '.' + (img.format or 'jpeg').lower().replace('jpeg', 'jpg')
+        except (pil.UnidentifiedImageError, OSError, SyntaxError):
+            raise ValueError('El archivo no es una imagen válida.')
+    nombre = hashlib.sha256(datos).hexdigest()[:16] + extension
+    ruta = os.path.join(carpeta, nombre)
+    if not os.path.exists(ruta):
+        _escribir(ruta, datos)
+    return nombre
+
+def generar_variantes(ruta):
+    """Crea las variantes que falten de una imagen. Devuelve cuántas creó."""
+    pil = _pillow()
+    if pil is None:
+        return 0
+    carpeta, nombre = os.path.split(ruta)
+    pendientes = {v: os.path.join(carpeta, nombre_variante(nombre, v)) for v in VARIANTES}
+    # También se rehacen las que son más viejas que el original (reemplazado)
+    modificado = os.path.getmtime(ruta)
+    pendientes = {v: r for v, r in pendientes.items()
+                  if not os.path.exists(r) or os.path.getmtime(r) < modificado}
+    if not pendientes:
+        return 0
+    with pil.Image.open(ruta) as original:
+        original = pil.ImageOps.exif_transpose(original)
+        if pil.formato == 'JPEG':
+            original = original.convert('RGB')
+        elif original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA')
+        for variante, destino in pendientes.items():
+            ancho = VARIANTES[variante]
+            img = original.copy()
+            # thumbnail no agranda: una foto chica conserva su tamaño
+            img.thumbnail((ancho, ancho * 4), pil.Image.LANCZOS)
+            fd, tmp = tempfile.mkstemp(dir=carpeta, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                img.save(f, pil.formato, quality=80, **({'method': 4} if pil.formato == 'WEBP' else {'optimize': True}))
+            os.replace(tmp, destino)
+    return len(pendientes)
+
+def procesar_en_segundo_plano(ruta, workers=2, al_terminar=None):
+    """Genera las variantes en el pool de workers; el request no espera."""
+    global _pool
+    if _pillow() is None:
+        return None
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='imagenes')
+    futuro = _pool.submit(generar_variantes, ruta)
+
+    def terminado(f):
+        if f.exception():
+            logger.error('No se pudieron generar las variantes de %s: %s', ruta, f.exception())
+        if al_terminar:
+            al_terminar(os.path.basename(ruta))
+    futuro.add_done_callback(terminado)
+    return futuro
@@ -0,0 +1,279 @@
+import csv
+import io
+import zipfile
+from decimal import Decimal, InvalidOperation
+from datetime import datetime
+from sqlalchemy import select, insert, update, bindparam, func, literal
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, Product, InventoryMovement
+import inventario
+import catalogo
+
+# Importación masiva de productos desde XLSX o CSV. El archivo se lee fila por
+# fila (openpyxl en modo read-only / csv.reader) y se guarda en lotes: una
+# consulta para buscar los existentes, un INSERT y un UPDATE con executemany
+# y un commit por lote. Así la memoria depende del tamaño del lote, no del
+# archivo.
+
+COLUMNAS = ('sku', 'nombre', 'descripcion', 'precio', 'stock', 'imagen')
+ALIAS = {'descripción': 'descripcion', 'código': 'sku', 'codigo': 'sku', 'cantidad': 'stock'}
+MODOS = ('reemplazar', 'sumar')
+IMAGEN_DEFAULT = 'guitarra.jpg'
+
+def _columna(titulo):
+    titulo = str(titulo or '').strip().lower()
+    return ALIAS.get(titulo, titulo)
+
+def leer_filas(archivo, nombre_archivo):
+    """Genera (número de fila, {columna: valor}) sin cargar el archivo completo."""
+    extension = nombre_archivo.rsplit('.', 1)[-1].lower() if '.' in nombre_archivo else ''
+    if extension == 'xlsx':
+        return _filas_xlsx(archivo)
+    if extension == 'csv':
+        return _filas_csv(archivo)
+    raise ValueError('Formato no soportado: sube un archivo .xlsx o .csv.')
+
+def _encabezado(titulos):
+    columnas = [_columna(t) for t in titulos]
+    if 'sku' not in columnas and 'nombre' not in columnas:
+        raise ValueError('El archivo debe tener una columna "sku" o "nombre".')
+    return columnas
+
+def _filas_xlsx(archivo):
+    import openpyxl  # pesado de importar: se carga al primer XLSX, no al arrancar
+    try:
+        wb = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, KeyError, OSError):
+        raise ValueError('El archivo no es un XLSX válido.')
+    try:
+        filas = wb.worksheets[0].iter_rows(values_only=True)
+        columnas = _encabezado(next(filas, ()))
+        for numero, valores in enumerate(filas, 2):
+            yield numero, dict(zip(columnas, valores))
+    finally:
+        wb.close()
+
+def _filas_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    try:
+        primera = texto.readline()
+        # Excel en español exporta con punto y coma
+        delimitador = ';' if primera.count(';') > primera.count(',') else ','
+        columnas = _encabezado(next(csv.reader([primera], delimiter=delimitador), []))
+        for numero, valores in enumerate(csv.reader(texto, delimiter=delimitador), 2):
+            yield numero, dict(zip(columnas, valores))
+    except UnicodeDecodeError:
+        raise ValueError('El CSV debe estar codificado en UTF-8.')
+    finally:
+        # Sin detach, cerrar el wrapper cerraría también el archivo subido
+        texto.detach()
+
+# --- VALIDACIÓN ---
+
+def _texto(valor, maximo, campo):
+    if valor is None:
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    valor = str(valor).strip()
+    if not valor:
+        return None
+    if maximo and len(valor) > maximo:
+        raise ValueError(f'{campo} supera {maximo} caracteres')
+    return valor
+
+def _precio(valor):
+    valor = _texto(valor, None, 'precio')
+    if valor is None:
+        return None
+    try:
+        precio = Decimal(valor.lstrip('$').replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f'precio inválido: {valor}')
+    if not precio.is_finite() or precio < 0:
+        raise ValueError(f'precio inválido: {valor}')
+    return precio.quantize(Decimal('0.01'))
+
+def _stock(valor):
+    valor = _texto(valor, None, 'stock')
+    if valor is None:
+        return None
+    try:
+        stock = int(valor)
+    except ValueError:
+        raise ValueError(f'stock inválido: {valor}')
+    if stock < 0:
+        raise ValueError(f'stock negativo: {valor}')
+    return stock
+
+def validar(valores):
+    """Convierte una fila del archivo en los campos de Product. Lanza ValueError."""
+    if all(v is None or str(v).strip() == '' for v in valores.values()):
+        return None
+    datos = {
+        'sku': _texto(valores.get('sku'), Product.sku.type.length, 'sku'),
+        'nombre': _texto(valores.get('nombre'), Product.nombre.type.length, 'nombre'),
+        'descripcion': _texto(valores.get('descripcion'), None, 'descripcion'),
+        'precio': _precio(valores.get('precio')),
+        'stock': _stock(valores.get('stock')),
+        'imagen': _texto(valores.get('imagen'), Product.imagen.type.length, 'imagen'),
+    }
+    if not datos['sku'] and not datos['nombre']:
+        raise ValueError('falta sku o nombre')
+    return datos
+
+def _claves(datos):
+    claves = set()
+    if datos['sku']:
+        claves.add(('sku', datos['sku']))
+    if datos['nombre']:
+        claves.add(('nombre', datos['nombre']))
+    return claves
+
+# --- GUARDADO POR LOTES ---
+
+def _sentencia_update(modo):
+    """UPDATE por id para executemany. Las celdas vacías (None) conservan el valor actual."""
+    t = Product.__table__
+
+    def param(columna):
+        return bindparam(f'b_{columna}', type_=t.c[columna].type)
+
+    if modo == 'sumar':
+        stock = t.c.stock + func.coalesce(param('stock'), 0)
+    else:
+        stock = func.coalesce(param('stock'), t.c.stock)
+    valores = {c: func.coalesce(param(c), t.c[c]) for c in COLUMNAS if c != 'stock'}
+    return update(t).where(t.c.id == bindparam('b_id')).values(stock=stock, **valores)
+
+def _buscar_existentes(lote):
+    """Busca por SKU y por nombre. Las filas quedan bloqueadas hasta el commit
+    del lote para que la diferencia de stock registrada en el libro sea exacta."""
+    skus = {d['sku'] for _, d in lote if d['sku']}
+    nombres = {d['nombre'] for _, d in lote if d['nombre']}
+    por_sku, por_nombre, stock = {}, {}, {}
+    if skus:
+        filas = db.session.execute(
+            select(Product.sku, Product.id, Product.stock).where(Product.sku.in_(skus)).with_for_update()
+        )
+        for sku, product_id, actual in filas:
+            por_sku[sku] = product_id
+            stock[product_id] = actual or 0
+    if nombres:
+        filas = db.session.execute(
+            select(Product.nombre, Product.id, Product.sku, Product.stock)
+            .where(Product.nombre.in_(nombres)).order_by(Product.id).with_for_update()
+        )
+        for nombre, product_id, sku, actual in filas:
+            por_nombre.setdefault(nombre, (product_id, sku))
+            stock[product_id] = actual or 0
+    return por_sku, por_nombre, stock
+
+def _registrar_nuevos(nombres, ultimo_id):
+    """Movimiento de alta para los productos recién insertados (id mayor al último
+    existente y sin movimientos), con un solo INSERT ... SELECT."""
+    sin_movimientos = ~select(InventoryMovement.id).where(InventoryMovement.product_id == Product.id).exists()
+    db.session.execute(insert(InventoryMovement).from_select(
+        ['product_id', 'cantidad', 'motivo', 'fecha'],
+        select(Product.id, Product.stock, literal('importacion'), literal(datetime.utcnow()))
+        .where(Product.id > ultimo_id, Product.nombre.in_(nombres), Product.stock != 0, sin_movimientos)
+    ))
+
+def _guardar_lote(lote, modo, resumen):
+    por_sku, por_nombre, stock = _buscar_existentes(lote)
+    nuevos, cambios, movimientos = [], [], []
+    for numero, datos in lote:
+        product_id = por_sku.get(datos['sku'])
+        if product_id is None and datos['nombre'] in por_nombre:
+            candidato, sku_actual = por_nombre[datos['nombre']]
+            # Por nombre solo se actualiza un producto que no tenga otro SKU
+            if not datos['sku'] or sku_actual is None:
+                product_id = candidato
+                por_nombre[datos['nombre']] = (candidato, datos['sku'] or sku_actual)
+
+        if product_id is not None:
+            cambios.append({'b_id': product_id, **{f'b_{c}': datos[c] for c in COLUMNAS}})
+            if datos['stock'] is not None:
+                delta = datos['stock'] if modo == 'sumar' else datos['stock'] - stock[product_id]
+                stock[product_id] += delta
+                movimientos.append((product_id, delta))
+        elif not datos['nombre'] or datos['precio'] is None:
+            resumen.error(numero, 'producto nuevo: nombre y precio son obligatorios')
+        else:
+            nuevos.append({
+                'sku': datos['sku'],
+                'nombre': datos['nombre'],
+                'descripcion': datos['descripcion'] or 'Nuevo producto',
+                'precio': datos['precio'],
+                'stock': datos['stock'] or 0,
+                'imagen': datos['imagen'] or IMAGEN_DEFAULT,
+            })
+
+    try:
+        if nuevos:
+            ultimo_id = db.session.query(func.coalesce(func.max(Product.id), 0)).scalar()
+            db.session.execute(insert(Product), nuevos)
+            _registrar_nuevos({p['nombre'] for p in nuevos}, ultimo_id)
+        if cambios:
+            db.session.execute(_sentencia_update(modo), cambios)
+            inventario.registrar(movimientos, 'importacion')
+        if nuevos or cambios:
+            catalogo.registrar_cambio()
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        motivo = str(getattr(e, 'orig', e)).splitlines()[0]
+        for numero, _ in lote:
+            resumen.error(numero, f'lote no guardado: {motivo}')
+        return
+    resumen.creados += len(nuevos)
+    resumen.actualizados += len(cambios)
+
+class Resumen:
+    """Conteos de la importación y errores por fila (se guardan hasta max_errores)."""
+
+    def __init__(self, max_errores):
+        self.max_errores = max_errores
+        self.filas = 0
+        self.creados = 0
+        self.actualizados = 0
+        self.total_errores = 0
+        self.errores = []
+
+    def error(self, numero, mensaje):
+        self.total_errores += 1
+        if len(self.errores) < self.max_errores:
+            self.errores.append((numero, mensaje))
+
+def importar_productos(archivo, nombre_archivo, modo='reemplazar', lote=1000, max_errores=500):
+    """Crea o actualiza productos desde el archivo, buscándolos por SKU o nombre.
+
+    modo='reemplazar' fija el stock al valor del archivo; modo='sumar' lo
+    suma al stock actual (entrada de mercancía). Lanza ValueError si el
+    archivo no se puede leer.
+    """
+    if modo not in MODOS:
+        raise ValueError(f'Modo desconocido: {modo}')
+    resumen = Resumen(max_errores)
+    pendientes, claves = [], set()
+    for numero, valores in leer_filas(archivo, nombre_archivo):
+        try:
+            datos = validar(valores)
+        except ValueError as e:
+            resumen.filas += 1
+            resumen.error(numero, str(e))
+            continue
+        if datos is None:
+            continue
+        resumen.filas += 1
+        claves_fila = _claves(datos)
+        # Un producto repetido dentro del lote se guarda en el lote siguiente
+        # para que la última fila gane y no se inserte dos veces.
+        if len(pendientes) >= lote or claves & claves_fila:
+            _guardar_lote(pendientes, modo, resumen)
+            pendientes, claves = [], set()
+        pendientes.append((numero, datos))
+        claves |= claves_fila
+    if pendientes:
+        _guardar_lote(pendientes, modo, resumen)
+    return resumen
@@ -0,0 +1,69 @@
+from datetime import datetime
+from sqlalchemy import select, insert, update, func, literal
+from models import db, Product, OrderItem, InventoryMovement
+
+# Cada cambio de stock se registra en InventoryMovement dentro de la misma
+# transacción. Motivos: 'inicial', 'alta', 'checkout', 'cancelacion', 'ajuste',
+# 'importacion'.
+
+def registrar(movimientos, motivo, order_id=None, user_id=None):
+    """movimientos: [(product_id, cantidad con signo)]. Un solo INSERT (executemany)."""
+    ahora = datetime.utcnow()
+    filas = [{'product_id': product_id, 'cantidad': cantidad, 'motivo': motivo,
+              'order_id': order_id, 'user_id': user_id, 'fecha': ahora}
+             for product_id, cantidad in movimientos if cantidad]
+    if filas:
+        db.session.execute(insert(InventoryMovement), filas)
+
+def reponer_pedido(order_id, user_id=None):
+    """Devuelve al stock todas las líneas del pedido con un UPDATE y registra los movimientos.
+
+    El stock se suma en la base (stock = stock + subconsulta), así no se pisa
+    con compras que ocurren al mismo tiempo.
+    """
+    cantidad = select(func.sum(OrderItem.quantity)) \
+        .where(OrderItem.order_id == order_id, OrderItem.product_id == Product.id) \
+        .scalar_subquery()
+    db.session.execute(
+        update(Product)
+        .where(Product.id.in_(select(OrderItem.product_id).where(OrderItem.order_id == order_id)))
+        .values(stock=Product.stock + cantidad)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(insert(InventoryMovement).from_select(
+        ['product_id', 'cantidad', 'motivo', 'order_id', 'user_id', 'fecha'],
+        select(OrderItem.product_id, func.sum(OrderItem.quantity), literal('cancelacion'),
+               literal(order_id), literal(user_id), literal(datetime.utcnow()))
+        .where(OrderItem.order_id == order_id)
+        .group_by(OrderItem.product_id)
+    ))
+    return [product_id for product_id, in db.session.execute(
+        select(OrderItem.product_id).where(OrderItem.order_id == order_id).distinct())]
+
+def conciliar(saldo_inicial=False):
+    """Compara Product.stock con la suma del libro en una sola consulta.
+
+    Devuelve [(product_id, nombre, stock, suma del libro)] de los que no
+    cuadran. Con saldo_inicial=True, a los productos sin ningún movimiento
+    se les registra primero un movimiento 'inicial' por su stock actual
+    (para empezar el libro en una base existente).
+    """
+    if saldo_inicial:
+        sin_movimientos = ~select(InventoryMovement.id) \
+            .where(InventoryMovement.product_id == Product.id).exists()
+        db.session.execute(insert(InventoryMovement).from_select(
+            ['product_id', 'cantidad', 'motivo', 'fecha'],
+            select(Product.id, Product.stock, literal('inicial'), literal(datetime.utcnow()))
+            .where(sin_movimientos, Product.stock != 0)
+        ))
+        db.session.commit()
+
+    libro = select(InventoryMovement.product_id, func.sum(InventoryMovement.cantidad).label('total')) \
+        .group_by(InventoryMovement.product_id).subquery()
+    total = func.coalesce(libro.c.total, 0)
+    return db.session.execute(
+        select(Product.id, Product.nombre, Product.stock, total)
+        .outerjoin(libro, libro.c.product_id == Product.id)
+        .where(func.coalesce(Product.stock, 0) != total)
+        .order_by(Product.id)
+    ).all()
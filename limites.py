@@ -0,0 +1,94 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import select, update, insert, delete, case
+from sqlalchemy.exc import IntegrityError
+from models import db, ThrottleBucket
+
+# Límite de intentos con token bucket: cada clave ('login_ip:1.2.3.4',
+# 'login_email:x@y.com') tiene `capacidad` fichas que se recargan a `por_minuto`.
+# Cada intento gasta una; sin fichas se rechaza sin llegar al hash de la
+# contraseña. Las reglas son (capacidad, por_minuto) en la configuración
+# (THROTTLE_<REGLA>).
+
+class MemoriaBuckets:
+    """Buckets en memoria del proceso: cada worker cuenta por separado, así que
+    el límite efectivo se multiplica por la cantidad de workers."""
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, clave, capacidad, por_segundo):
+        """Devuelve 0 si hay ficha, o los segundos hasta la próxima."""
+        ahora = time.monotonic()
+        with self._lock:
+            fichas, antes = self._buckets.pop(clave, (capacidad, ahora))
+            fichas = min(capacidad, fichas + (ahora - antes) * por_segundo)
+            espera = 0.0
+            if fichas >= 1:
+                fichas -= 1
+            else:
+                espera = (1 - fichas) / por_segundo
+            self._buckets[clave] = (fichas, ahora)
+            # Desalojo LRU: las claves viejas ya tendrían el bucket lleno
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return espera
+
+class BaseDatosBuckets:
+    """Buckets compartidos por todos los workers en la tabla throttle_bucket.
+
+    Cada intento es un UPDATE condicional en su propia transacción (no depende
+    del commit del request: un login fallido también cuenta).
+    """
+
+    # Fracción de altas que además borra buckets inactivos hace más de un día
+    LIMPIEZA = 0.01
+
+    def consumir(self, clave, capacidad, por_segundo):
+        t = ThrottleBucket.__table__
+        ahora = time.time()
+        recargado = t.c.fichas + (ahora - t.c.actualizado) * por_segundo
+        fichas = case((recargado > capacidad, capacidad), else_=recargado)
+        with db.engine.begin() as conn:
+            result = conn.execute(
+                update(t).where(t.c.clave == clave, fichas >= 1)
+                .values(fichas=fichas - 1, actualizado=ahora)
+            )
+            if result.rowcount:
+                return 0.0
+            actual = conn.execute(select(fichas).where(t.c.clave == clave)).scalar()
+        if actual is not None:
+            return (1 - actual) / por_segundo
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(insert(t).values(clave=clave, fichas=capacidad - 1, actualizado=ahora))
+                if random.random() < self.LIMPIEZA:
+                    conn.execute(delete(t).where(t.c.actualizado < ahora - 86400))
+        except IntegrityError:
+            # Otro worker creó la clave al mismo tiempo
+            return self.consumir(clave, capacidad, por_segundo)
+        return 0.0
+
+BACKENDS = {'memoria': MemoriaBuckets, 'db': BaseDatosBuckets}
+
+class Limitador:
+    """Aplica las reglas THROTTLE_<REGLA> con el backend de THROTTLE_BACKEND
+    ('memoria', 'db' o una instancia con el método consumir). Cada app tiene
+    su backend en app.extensions['limitador']."""
+
+    def init_app(self, app):
+        app.config.setdefault('THROTTLE_ACTIVO', True)
+        backend = app.config.setdefault('THROTTLE_BACKEND', 'memoria')
+        app.extensions['limitador'] = BACKENDS[backend]() if isinstance(backend, str) else backend
+
+    def consumir(self, regla, valor):
+        """Segundos que hay que esperar (0 = permitido) para la regla y el valor."""
+        if not valor or not current_app.config['THROTTLE_ACTIVO']:
+            return 0.0
+        capacidad, por_minuto = current_app.config[f'THROTTLE_{regla.upper()}']
+        return current_app.extensions['limitador'].consumir(f'{regla}:{valor}'.lower(), capacidad, por_minuto / 60)
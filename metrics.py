@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('melodias.sql')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, limite in enumerate(self.buckets):
+            if value <= limite:
+                self.counts[i] += 1
+
+def _labels(labels):
+    return ','.join(f'{k}="{v}"' for k, v in labels.items())
+
+class Registro:
+    """Contadores de una app (app.extensions['metrics'])."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.queries = {}
+        self.db_time = {}
+        self.requests = {}
+        self.slow_queries = {}
+
+    def observe(self, route, status, elapsed, sql_count, sql_time):
+        with self._lock:
+            self.latency.setdefault(route, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            self.queries.setdefault(route, Histogram(QUERY_BUCKETS)).observe(sql_count)
+            self.db_time.setdefault(route, Histogram(LATENCY_BUCKETS)).observe(sql_time)
+            key = (route, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def slow_query(self, route):
+        with self._lock:
+            self.slow_queries[route] = self.slow_queries.get(route, 0) + 1
+
+class Metrics:
+    """Latencia por ruta, consultas SQL por request y log de consultas lentas.
+
+    Las consultas se miden con eventos del Engine de SQLAlchemy y se atribuyen
+    a la ruta que está atendiendo el request en curso (flask.g). Los contadores
+    son de cada app; las fuentes registradas con register() valen para todas.
+    """
+
+    def __init__(self):
+        self._sources = []
+
+    def init_app(self, app):
+        app.config.setdefault('SLOW_QUERY_MS', 200)
+        app.config.setdefault('SERVER_TIMING', False)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        app.extensions['metrics'] = Registro()
+
+    def register(self, source):
+        """source() devuelve [(nombre, tipo, {labels}, valor)] para agregar al export."""
+        self._sources.append(source)
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        g.sql_count = 0
+        g.sql_time = 0.0
+
+    def _after_request(self, response):
+        if 'metrics_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_start
+        current_app.extensions['metrics'].observe(request.endpoint or 'sin_ruta', response.status_code,
+                                                  elapsed, g.sql_count, g.sql_time)
+        if current_app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = (
+                f'app;dur={elapsed * 1000:.1f}, db;dur={g.sql_time * 1000:.1f};desc="{g.sql_count} queries"'
+            )
+        return response
+
+    def render_prometheus(self):
+        """Exporta todo (de la app actual) en el formato de texto de Prometheus."""
+        lines = []
+        registro = current_app.extensions['metrics']
+        with registro._lock:
+            _histograms(lines, 'melodias_request_duration_seconds', 'Latencia por ruta', registro.latency)
+            _histograms(lines, 'melodias_db_queries_per_request', 'Consultas SQL por request', registro.queries)
+            _histograms(lines, 'melodias_db_time_seconds', 'Tiempo en BD por request', registro.db_time)
+            lines.append('# HELP melodias_requests_total Requests atendidos')
+            lines.append('# TYPE melodias_requests_total counter')
+            for (route, status), value in sorted(registro.requests.items()):
+                lines.append(f'melodias_requests_total{{{_labels({"route": route, "status": status})}}} {value}')
+            lines.append('# HELP melodias_slow_queries_total Consultas sobre SLOW_QUERY_MS')
+            lines.append('# TYPE melodias_slow_queries_total counter')
+            for route, value in sorted(registro.slow_queries.items()):
+                lines.append(f'melodias_slow_queries_total{{{_labels({"route": route})}}} {value}')
+        # Las muestras de una misma métrica deben quedar juntas en el texto
+        familias = {}
+        for source in self._sources:
+            for nombre, tipo, labels, valor in source():
+                familias.setdefault(nombre, (tipo, []))[1].append((labels, valor))
+        for nombre, (tipo, muestras) in familias.items():
+            lines.append(f'# TYPE {nombre} {tipo}')
+            for labels, valor in muestras:
+                lines.append(f'{nombre}{{{_labels(labels)}}} {valor}')
+        return '\n'.join(lines) + '\n'
+
+def cache_source(nombre, cache):
+    """Fuente de métricas para un TTLCache (aciertos, fallos, desalojos, tamaño)."""
+    def source():
+        stats = cache.stats()
+        labels = {'cache': nombre}
+        return [
+            ('melodias_cache_hits_total', 'counter', labels, stats['hits']),
+            ('melodias_cache_misses_total', 'counter', labels, stats['misses']),
+            ('melodias_cache_evictions_total', 'counter', labels, stats['evictions']),
+            ('melodias_cache_entries', 'gauge', labels, stats['size']),
+        ]
+    return source
+
+def _histograms(lines, name, help_text, histograms):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for route, h in sorted(histograms.items()):
+        for limite, count in zip(h.buckets, h.counts):
+            lines.append(f'{name}_bucket{{{_labels({"route": route, "le": limite})}}} {count}')
+        lines.append(f'{name}_bucket{{{_labels({"route": route, "le": "+Inf"})}}} {h.count}')
+        lines.append(f'{name}_sum{{{_labels({"route": route})}}} {h.sum:.6f}')
+        lines.append(f'{name}_count{{{_labels({"route": route})}}} {h.count}')
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if not has_request_context() or 'metrics_start' not in g:
+        return
+    g.sql_count += 1
+    g.sql_time += elapsed
+    if elapsed * 1000 >= current_app.config['SLOW_QUERY_MS']:
+        route = request.endpoint or 'sin_ruta'
+        logger.warning('SQL lenta (%.1f ms) en %s: %s', elapsed * 1000, route, statement)
+        registro = current_app.extensions.get('metrics')
+        if registro:
+            registro.slow_query(route)
@@ -2,8 +2,10 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
 from datetime import timedelta 
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+# La sesión decide por consulta si va a la primaria o a la réplica (replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -17,21 +19,41 @@ class User(UserMixin, db.Model):
     is_active = db.Column(db.Boolean, default=True)
 
 class Product(db.Model):
+    # Búsqueda de texto en MySQL; en SQLite se usa el índice en memoria de search.py
+    __table_args__ = (
+        db.Index('ft_product_texto', 'nombre', 'descripcion', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    nombre = db.Column(db.String(100), nullable=False)
+    # Código del proveedor; opcional, usado por la importación masiva
+    sku = db.Column(db.String(64), unique=True, index=True)
+    nombre = db.Column(db.String(100), nullable=False, index=True)
     descripcion = db.Column(db.Text)
-    precio = db.Column(db.Numeric(10, 2), nullable=False) 
+    precio = db.Column(db.Numeric(10, 2), nullable=False, index=True) 
     stock = db.Column(db.Integer, default=0)
+    # Unidades apartadas en carritos (StockReservation); disponible = stock - reservado
+    reservado = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     imagen = db.Column(db.String(255)) 
+    # onupdate también aplica a los UPDATE de Core (stock en checkout,
+    # cancelaciones e importación), así cualquier cambio renueva el ETag
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
 class Order(db.Model):
+    # Índices para el historial del cliente, la lista del admin y los filtros por estado
+    __table_args__ = (
+        db.Index('ix_order_user_date', 'user_id', 'date'),
+        db.Index('ix_order_status_date', 'status', 'date'),
+        db.Index('ix_order_date', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     date = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='Pendiente de envío')
     total = db.Column(db.Numeric(10, 2), nullable=False)
     
-    tracking_number = db.Column(db.String(100))
+    # Única: se deriva del id del pedido (ver _numero_guia en app.py)
+    tracking_number = db.Column(db.String(100), unique=True, index=True)
     shipping_company = db.Column(db.String(100))
 
     items = db.relationship('OrderItem', backref='order', lazy=True)
@@ -49,21 +71,127 @@ class Order(db.Model):
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    product_name = db.Column(db.String(100))
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Numeric(10, 2), nullable=False)
+
+class OrderArchive(db.Model):
+    # Pedidos entregados o cancelados antiguos, movidos por historico.py para que
+    # Order y OrderItem queden chicas. Mismas columnas e id que en Order; el
+    # historial del cliente, el reporte y el rastreo los leen junto con Order.
+    __tablename__ = 'order_archive'
+    __table_args__ = (
+        db.Index('ix_order_archive_user_date', 'user_id', 'date'),
+        db.Index('ix_order_archive_date', 'date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date = db.Column(db.DateTime)
+    status = db.Column(db.String(20))
+    total = db.Column(db.Numeric(10, 2), nullable=False)
+    tracking_number = db.Column(db.String(100), unique=True, index=True)
+    shipping_company = db.Column(db.String(100))
+    archivado = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    items = db.relationship('OrderItemArchive', backref='order', lazy=True)
+    user = db.relationship('User')
+
+    delivery_window = Order.delivery_window
+
+class OrderItemArchive(db.Model):
+    # Sin llave foránea a Product: un producto que solo figura en pedidos
+    # archivados se puede borrar (el nombre queda en product_name).
+    __tablename__ = 'order_item_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order_archive.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, nullable=False, index=True)
     product_name = db.Column(db.String(100))
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Numeric(10, 2), nullable=False)
 
 class PaymentMethod(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     card_type = db.Column(db.String(20))
     card_holder = db.Column(db.String(100))
     masked_number = db.Column(db.String(20))
     
     user = db.relationship('User', backref='payment_methods')
 
+class CartItem(db.Model):
+    # Carrito guardado en servidor (opcional, ver CART_SERVER_SIDE en app.py)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+
 class Courier(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False)
+
+class DailySales(db.Model):
+    # Resumen de ventas por día, estado y producto. Se mantiene al crear o
+    # cambiar de estado un pedido (ventas.py) y se reconstruye con
+    # "flask --app app reconstruir-ventas".
+    # La llave primaria empieza por el día, así los KPIs por rango de fechas
+    # recorren solo los días pedidos.
+    __tablename__ = 'daily_sales'
+
+    dia = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    ingresos = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+class InventoryMovement(db.Model):
+    # Libro de movimientos de stock: solo se agregan filas. Sin llaves foráneas
+    # para que borrar un producto o archivar pedidos no toque el historial.
+    # La suma de cantidad por producto debe ser igual a Product.stock
+    # (ver "flask --app app conciliar-inventario").
+    __tablename__ = 'inventory_movement'
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False, index=True)
+    cantidad = db.Column(db.Integer, nullable=False)
+    motivo = db.Column(db.String(20), nullable=False)
+    order_id = db.Column(db.Integer, index=True)
+    user_id = db.Column(db.Integer)
+    fecha = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class StockReservation(db.Model):
+    # Unidades apartadas por un carrito hasta "vence" (ver reservas.py). Cada
+    # cambio se refleja también en Product.reservado, así el disponible se lee
+    # de la fila del producto sin sumar reservas. Sin llave foránea: las
+    # reservas de un producto borrado desaparecen al vencer.
+    __tablename__ = 'stock_reservation'
+    __table_args__ = (
+        db.UniqueConstraint('carrito', 'product_id', name='uq_reserva_carrito_producto'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    carrito = db.Column(db.String(32), nullable=False)
+    product_id = db.Column(db.Integer, nullable=False)
+    cantidad = db.Column(db.Integer, nullable=False)
+    vence = db.Column(db.DateTime, nullable=False, index=True)
+
+class CatalogChange(db.Model):
+    # Registro de cambios del catálogo (catalogo.py): el id de la última fila es
+    # la versión que comparan las cachés de cada worker. product_id NULL = cambio
+    # masivo (importación). Sin llave foránea: registra también las bajas.
+    __tablename__ = 'catalog_change'
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer)
+    fecha = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class ThrottleBucket(db.Model):
+    # Token bucket compartido por todos los workers (limites.py, THROTTLE_BACKEND='db').
+    # "actualizado" es epoch en segundos: la recarga se calcula en el mismo UPDATE.
+    __tablename__ = 'throttle_bucket'
+
+    clave = db.Column(db.String(150), primary_key=True)
+    fichas = db.Column(db.Float, nullable=False)
+    actualizado = db.Column(db.Float, nullable=False, index=True)
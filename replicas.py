@@ -0,0 +1,146 @@
+import functools
+import logging
+import threading
+import time
+from flask import g, current_app, has_request_context, session as cookie
+from flask_sqlalchemy.session import Session
+from sqlalchemy.exc import SQLAlchemyError, OperationalError
+from sqlalchemy.sql import Select
+
+logger = logging.getLogger('melodias.replica')
+
+BIND = 'replica'
+
+class RoutingSession(Session):
+    """Sesión que manda los SELECT de las rutas @solo_lectura a la réplica.
+
+    Todo lo demás (flush, INSERT/UPDATE/DELETE, SELECT ... FOR UPDATE, texto
+    SQL) y cualquier consulta fuera de esas rutas va a la primaria.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            replicas = current_app.extensions.get('replicas')
+            if replicas is not None:
+                engine = replicas.elegir(self, clause)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+class Replicas:
+    """Enrutamiento de lecturas a la réplica (bind 'replica') con respaldo.
+
+    - La réplica se verifica con un SELECT 1 cada REPLICA_CHECK_INTERVAL
+      segundos; si no responde (o una consulta en ella falla) las lecturas van
+      a la primaria hasta el siguiente chequeo.
+    - Después de escribir, el navegador de ese usuario lee de la primaria por
+      REPLICA_STICKY_SECONDS para ver sus propios cambios aunque la réplica
+      vaya atrasada.
+
+    El estado (salud, contadores, configuración) es de cada app: vive en
+    app.extensions['replicas'] como un EstadoReplica.
+    """
+
+    def init_app(self, app):
+        app.config.setdefault('REPLICA_CHECK_INTERVAL', 10)
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+        app.extensions['replicas'] = EstadoReplica(app.config)
+        app.after_request(self._after_request)
+
+    def _after_request(self, response):
+        estado = current_app.extensions['replicas']
+        if estado.configurada and g.get('replica_escritura'):
+            cookie['_primaria_hasta'] = int(time.time() + estado.pegajoso) + 1
+        return response
+
+    def source(self):
+        """Fuente de métricas: consultas por destino, fallos y estado de la réplica."""
+        estado = current_app.extensions['replicas']
+        return [
+            ('melodias_replica_consultas_total', 'counter', {'destino': 'replica'}, estado.consultas['replica']),
+            ('melodias_replica_consultas_total', 'counter', {'destino': 'primaria'}, estado.consultas['primaria']),
+            ('melodias_replica_fallos_total', 'counter', {}, estado.fallos),
+            ('melodias_replica_sana', 'gauge', {}, int(estado._sana)),
+        ]
+
+class EstadoReplica:
+    """Salud de la réplica y contadores de una app."""
+
+    def __init__(self, config):
+        self._lock = threading.Lock()
+        self._sana = True
+        self._siguiente_chequeo = 0.0
+        self.consultas = {'replica': 0, 'primaria': 0}
+        self.fallos = 0
+        self.intervalo = config['REPLICA_CHECK_INTERVAL']
+        self.pegajoso = config['REPLICA_STICKY_SECONDS']
+        self.configurada = BIND in config.get('SQLALCHEMY_BINDS', {})
+
+    def elegir(self, session, clause):
+        """Engine de la réplica para esta consulta, o None para usar la primaria."""
+        if not self.configurada:
+            return None
+        lectura = isinstance(clause, Select) and clause._for_update_arg is None and not session._flushing
+        if not lectura:
+            if session._flushing or clause is None or getattr(clause, 'is_dml', False):
+                g.replica_escritura = True
+            return None
+        if not g.get('solo_lectura') or g.get('replica_escritura'):
+            return None
+        if cookie.get('_primaria_hasta', 0) > time.time() or not self.disponible():
+            self.consultas['primaria'] += 1
+            return None
+        self.consultas['replica'] += 1
+        g.uso_replica = True
+        return session._db.engines[BIND]
+
+    def disponible(self):
+        ahora = time.monotonic()
+        if ahora < self._siguiente_chequeo:
+            return self._sana
+        with self._lock:
+            if ahora >= self._siguiente_chequeo:
+                self._sana = self._ping()
+                self._siguiente_chequeo = ahora + self.intervalo
+        return self._sana
+
+    def _ping(self):
+        engine = current_app.extensions['sqlalchemy'].engines[BIND]
+        try:
+            with engine.connect() as conn:
+                conn.exec_driver_sql('SELECT 1')
+            return True
+        except SQLAlchemyError as e:
+            logger.warning('Réplica no disponible, se lee de la primaria: %s', e)
+            self.fallos += 1
+            return False
+
+    def marcar_caida(self, error):
+        logger.warning('Falló una consulta en la réplica, se lee de la primaria: %s', error)
+        with self._lock:
+            self._sana = False
+            self._siguiente_chequeo = time.monotonic() + self.intervalo
+            self.fallos += 1
+
+def solo_lectura(vista):
+    """Las consultas de la vista pueden ir a la réplica.
+
+    Si una consulta falla en la réplica la vista se repite completa contra la
+    primaria: solo se usa en vistas que no escriben.
+    """
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        replicas = current_app.extensions.get('replicas')
+        if replicas is None or not replicas.configurada:
+            return vista(*args, **kwargs)
+        g.solo_lectura = True
+        try:
+            return vista(*args, **kwargs)
+        except OperationalError as e:
+            if not g.get('uso_replica'):
+                raise
+            replicas.marcar_caida(e)
+            current_app.extensions['sqlalchemy'].session.rollback()
+            g.solo_lectura = False
+            return vista(*args, **kwargs)
+    return envoltura
@@ -0,0 +1,201 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, bindparam, func
+from models import db, Product, StockReservation
+from schema import soporta_skip_locked
+
+logger = logging.getLogger('melodias.reservas')
+
+# Reservas de stock por carrito. Agregar al carrito aparta las unidades con un
+# UPDATE condicional sobre Product.reservado (disponible = stock - reservado),
+# así la competencia por un producto se resuelve en ese UPDATE corto y no en
+# el checkout. El checkout convierte las reservas en venta y un hilo por
+# proceso libera las vencidas en lotes.
+#
+# Orden de bloqueo en todas las operaciones: primero las filas de
+# StockReservation y después las de Product (evita deadlocks en MySQL).
+# Las funciones no hacen commit, salvo liberar_vencidas.
+
+def _sin_tocar_fecha():
+    # Apartar unidades no cambia lo que muestra el catálogo: sin esto el
+    # onupdate de updated_at renovaría el ETag de todo el catálogo en cada carrito
+    return {'updated_at': Product.updated_at}
+
+def reservadas(carrito):
+    """{product_id: (cantidad, vence)} de las reservas del carrito."""
+    if not carrito:
+        return {}
+    filas = db.session.execute(
+        select(StockReservation.product_id, StockReservation.cantidad, StockReservation.vence)
+        .where(StockReservation.carrito == carrito)
+    )
+    return {product_id: (cantidad, vence) for product_id, cantidad, vence in filas}
+
+def ajustar(carrito, product_id, cantidad, minutos):
+    """Deja apartadas `cantidad` unidades del producto para el carrito (0 libera)
+    y renueva el vencimiento. Devuelve False, sin cambiar nada, si no hay
+    suficientes unidades disponibles para el aumento."""
+    fila = db.session.execute(
+        select(StockReservation)
+        .where(StockReservation.carrito == carrito, StockReservation.product_id == product_id)
+        .with_for_update()
+    ).scalar_one_or_none()
+    delta = cantidad - (fila.cantidad if fila else 0)
+    if delta > 0:
+        result = db.session.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.stock - Product.reservado >= delta)
+            .values(reservado=Product.reservado + delta, **_sin_tocar_fecha())
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            return False
+    elif delta < 0:
+        devolver({product_id: -delta})
+
+    if cantidad <= 0:
+        if fila:
+            db.session.delete(fila)
+    elif fila:
+        fila.cantidad = cantidad
+        fila.vence = datetime.utcnow() + timedelta(minutes=minutos)
+    else:
+        db.session.add(StockReservation(carrito=carrito, product_id=product_id, cantidad=cantidad,
+                                        vence=datetime.utcnow() + timedelta(minutes=minutos)))
+    return True
+
+def disponible(product_id, carrito=None):
+    """Unidades que el carrito puede tener: disponible general más lo que ya apartó."""
+    stock, reservado = db.session.execute(
+        select(Product.stock, Product.reservado).where(Product.id == product_id)
+    ).one_or_none() or (0, 0)
+    propias = reservadas(carrito).get(product_id, (0, None))[0] if carrito else 0
+    return max((stock or 0) - reservado + propias, 0)
+
+def devolver(cantidades):
+    """Resta de Product.reservado: {product_id: unidades}. Un UPDATE con executemany."""
+    if cantidades:
+        # Tabla (Core) y no el modelo: con el modelo, executemany sería un bulk update por PK del ORM
+        t = Product.__table__
+        db.session.execute(
+            update(t)
+            .where(t.c.id == bindparam('b_id'))
+            .values(reservado=t.c.reservado - bindparam('b_cantidad'), updated_at=t.c.updated_at),
+            [{'b_id': product_id, 'b_cantidad': cantidad} for product_id, cantidad in cantidades.items()]
+        )
+
+def _quitar(carrito):
+    filas = db.session.execute(
+        select(StockReservation.id, StockReservation.product_id, StockReservation.cantidad)
+        .where(StockReservation.carrito == carrito)
+        .order_by(StockReservation.product_id)
+        .with_for_update()
+    ).all()
+    if filas:
+        db.session.execute(delete(StockReservation).where(StockReservation.id.in_([f.id for f in filas])))
+    return {f.product_id: f.cantidad for f in filas}
+
+def liberar_carrito(carrito):
+    """Suelta todas las reservas del carrito. Devuelve los product_ids afectados."""
+    if not carrito:
+        return []
+    cantidades = _quitar(carrito)
+    devolver(cantidades)
+    return list(cantidades)
+
+def tomar(carrito):
+    """Para el checkout: borra las reservas del carrito y devuelve {product_id: cantidad}.
+
+    Quien llama descuenta esas unidades de Product.reservado junto con el
+    stock vendido (ver _crear_pedido en app.py) y devuelve con devolver() las
+    de productos que ya no están en el carrito.
+    """
+    return _quitar(carrito) if carrito else {}
+
+def liberar_vencidas(lote=500, product_id=None):
+    """Libera las reservas vencidas en lotes (un commit por lote).
+
+    Devuelve el set de product_ids afectados. Con varios procesos barriendo a
+    la vez, SKIP LOCKED reparte las filas donde el servidor lo soporta (MySQL 8,
+    MariaDB 10.6, PostgreSQL); en los demás se espera el bloqueo con FOR UPDATE.
+    """
+    saltar = soporta_skip_locked(db.engine)
+    afectados = set()
+    while True:
+        consulta = select(StockReservation.id).where(StockReservation.vence < datetime.utcnow())
+        if product_id is not None:
+            consulta = consulta.where(StockReservation.product_id == product_id)
+        ids = db.session.scalars(
+            consulta.order_by(StockReservation.vence).limit(lote).with_for_update(skip_locked=saltar)
+        ).all()
+        if not ids:
+            break
+        en_lote = StockReservation.id.in_(ids)
+        cantidad = select(func.sum(StockReservation.cantidad)) \
+            .where(en_lote, StockReservation.product_id == Product.id).scalar_subquery()
+        productos = select(StockReservation.product_id).where(en_lote)
+        afectados.update(db.session.scalars(productos.distinct()))
+        db.session.execute(
+            update(Product)
+            .where(Product.id.in_(productos))
+            .values(reservado=Product.reservado - cantidad, **_sin_tocar_fecha())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(delete(StockReservation).where(en_lote))
+        db.session.commit()
+        if len(ids) < lote:
+            break
+    return afectados
+
+def recalcular():
+    """Corrige Product.reservado con la suma de las reservas vigentes (un UPDATE).
+    Devuelve cuántos productos cambiaron."""
+    suma = select(func.coalesce(func.sum(StockReservation.cantidad), 0)) \
+        .where(StockReservation.product_id == Product.id).scalar_subquery()
+    result = db.session.execute(
+        update(Product)
+        .where(Product.reservado != suma)
+        .values(reservado=suma, **_sin_tocar_fecha())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+# --- BARRIDO EN SEGUNDO PLANO ---
+
+_barrendero_lock = threading.Lock()
+
+def iniciar_barrendero(app, intervalo, lote=500, al_liberar=None):
+    """Lanza (una vez por app y proceso) el hilo que libera las reservas vencidas.
+
+    Se llama en cada request: con gunicorn y preload los hilos del master no
+    pasan a los workers, así que cada worker lanza el suyo al primer request.
+    El pid se guarda en app.extensions: tras el fork la copia del worker
+    todavía trae el del master.
+    """
+    if not intervalo or app.extensions.get('barrendero_reservas') == os.getpid():
+        return
+    with _barrendero_lock:
+        if app.extensions.get('barrendero_reservas') == os.getpid():
+            return
+        app.extensions['barrendero_reservas'] = os.getpid()
+    threading.Thread(target=_barrer, args=(app, intervalo, lote, al_liberar),
+                     name='reservas', daemon=True).start()
+
+def _barrer(app, intervalo, lote, al_liberar):
+    while True:
+        time.sleep(intervalo)
+        with app.app_context():
+            try:
+                afectados = liberar_vencidas(lote)
+            except Exception:
+                db.session.rollback()
+                logger.exception('No se pudieron liberar las reservas vencidas')
+                continue
+            if afectados:
+                logger.info('Reservas vencidas liberadas en %d productos', len(afectados))
+                if al_liberar:
+                    al_liberar(*afectados)
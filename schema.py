@@ -0,0 +1,129 @@
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+from models import db, Order, OrderItem, OrderArchive, PaymentMethod, StockReservation, CatalogChange
+
+# --- MIGRACIÓN DE BASES EXISTENTES ---
+
+def upgrade_schema():
+    """Crea las tablas, columnas e índices que falten en una base ya existente.
+
+    Solo agrega: nunca borra ni modifica columnas. Devuelve la lista de
+    cambios aplicados.
+    """
+    engine = db.engine
+    preparer = engine.dialect.identifier_preparer
+    existentes = set(inspect(engine).get_table_names())
+    db.create_all()
+    insp = inspect(engine)
+    cambios = [f'tabla {t.name}' for t in db.metadata.sorted_tables if t.name not in existentes]
+
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            columnas = {c['name'] for c in insp.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columnas:
+                    ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}'))
+                    cambios.append(f'columna {table.name}.{column.name}')
+
+            indices = {i['name'] for i in insp.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indices and _aplica(index, engine.dialect):
+                    index.create(conn)
+                    cambios.append(f'índice {index.name}')
+    return cambios
+
+def _aplica(index, dialect):
+    """False para índices limitados a otro motor con ddl_if (p. ej. FULLTEXT de MySQL)."""
+    ddl_if = getattr(index, '_ddl_if', None)
+    return ddl_if is None or ddl_if.dialect in (None, dialect.name)
+
+# --- CAPACIDADES DEL MOTOR ---
+
+def soporta_skip_locked(engine):
+    """True si el servidor acepta FOR UPDATE SKIP LOCKED (MySQL 8, MariaDB 10.6,
+    PostgreSQL 9.5). MySQL 5.7 y MariaDB anteriores lo rechazan como error de sintaxis."""
+    dialecto = engine.dialect
+    if dialecto.server_version_info is None:
+        # El dialecto lee la versión del servidor en la primera conexión
+        with engine.connect():
+            pass
+    version = dialecto.server_version_info or ()
+    if dialecto.name == 'mysql':
+        return version >= ((10, 6) if dialecto.is_mariadb else (8, 0, 1))
+    if dialecto.name == 'postgresql':
+        return version >= (9, 5)
+    return dialecto.name == 'oracle'
+
+# --- VERIFICACIÓN DE PLANES DE CONSULTA ---
+
+def hot_queries():
+    """Consultas de las rutas más usadas, con valores de ejemplo.
+
+    Cada entrada es (query, recorrido_ordenado). Con recorrido_ordenado=True se
+    acepta recorrer un índice en orden (listados con LIMIT sin filtro).
+    """
+    desde = datetime(2024, 1, 1)
+    return {
+        'profile: pedidos del cliente':
+            (Order.query.filter_by(user_id=1).order_by(Order.date.desc()), False),
+        'admin: lista de pedidos':
+            (Order.query.order_by(Order.date.desc(), Order.id.desc()).limit(50), True),
+        'admin/report: pedidos por estado y fecha':
+            (Order.query.filter(Order.status == 'Enviado', Order.date >= desde).order_by(Order.date.desc()).limit(50), False),
+        'cancel_order: items del pedido':
+            (OrderItem.query.filter_by(order_id=1), False),
+        'items por producto':
+            (OrderItem.query.filter_by(product_id=1), False),
+        'tracking: pedido por guía':
+            (Order.query.filter_by(tracking_number='TRK-000000018'), False),
+        'profile: pedidos archivados del cliente':
+            (OrderArchive.query.filter_by(user_id=1).order_by(OrderArchive.date.desc()), False),
+        'tracking: pedido archivado por guía':
+            (OrderArchive.query.filter_by(tracking_number='TRK-000000018'), False),
+        'archivo: pedidos a archivar':
+            (Order.query.filter(Order.status.in_(('Entregado', 'Cancelado')), Order.date < desde)
+             .order_by(Order.date).limit(1000), False),
+        'cart/profile: métodos de pago':
+            (PaymentMethod.query.filter_by(user_id=1), False),
+        'carrito: reservas de stock':
+            (StockReservation.query.filter_by(carrito='0' * 32), False),
+        'catálogo: versión (último cambio)':
+            (CatalogChange.query.order_by(CatalogChange.id.desc()).limit(1), True),
+        'barrido: reservas vencidas':
+            (StockReservation.query.filter(StockReservation.vence < desde).order_by(StockReservation.vence).limit(500), False),
+    }
+
+def _compilar(query, dialect):
+    return str(query.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+def _plan(conn, sql, dialect_name, recorrido_ordenado):
+    """Devuelve (líneas del plan, hay_full_scan)."""
+    if dialect_name == 'sqlite':
+        detalles = [row[-1] for row in conn.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+        full_scan = any(
+            d.startswith('SCAN ') and not (recorrido_ordenado and 'USING INDEX' in d)
+            for d in detalles
+        )
+        return detalles, full_scan
+    if dialect_name == 'mysql':
+        filas = [dict(row._mapping) for row in conn.execute(text(f'EXPLAIN {sql}'))]
+        detalles = [f"{f['table']}: type={f['type']} key={f['key']}" for f in filas]
+        full_scan = any(
+            f['type'] == 'ALL' or (f['type'] == 'index' and not recorrido_ordenado)
+            for f in filas
+        )
+        return detalles, full_scan
+    raise RuntimeError(f'EXPLAIN no soportado para {dialect_name}')
+
+def explain_hot_queries():
+    """Ejecuta EXPLAIN sobre cada consulta crítica. Devuelve [(nombre, plan, full_scan)]."""
+    engine = db.engine
+    resultados = []
+    with engine.connect() as conn:
+        for nombre, (query, recorrido_ordenado) in hot_queries().items():
+            sql = _compilar(query, engine.dialect)
+            detalles, full_scan = _plan(conn, sql, engine.dialect.name, recorrido_ordenado)
+            resultados.append((nombre, detalles, full_scan))
+    return resultados
@@ -0,0 +1,196 @@
+import bisect
+import heapq
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+_TOKEN_RE = re.compile(r'[a-z0-9]{2,}')
+_ACENTOS = str.maketrans('áéíóúüñàèìòùâêîôûäëïö', 'aeiouunaeiouaeiouaeio')
+
+def tokenize(texto):
+    """Minúsculas, sin acentos, solo palabras de 2+ caracteres."""
+    if not texto:
+        return []
+    texto = texto.lower().translate(_ACENTOS)
+    if not texto.isascii():
+        texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return _TOKEN_RE.findall(texto)
+
+ORDENES = ('relevancia', 'precio_asc', 'precio_desc', 'nombre')
+
+class CatalogIndex:
+    """Índice invertido en memoria sobre nombre y descripción de los productos.
+
+    Se usa cuando la base no tiene FULLTEXT (SQLite). `version` es la versión
+    del catálogo (catalogo.py) que refleja: se construye completo una vez y
+    después se actualiza con refresh() por los productos que cambiaron.
+    """
+
+    def __init__(self):
+        self.version = None
+        # La toma quien construye el índice completo: una sola construcción a la vez
+        self.construccion = threading.Lock()
+        self._lock = threading.Lock()
+        self._postings = {}
+        # Postings solo del nombre: el puntaje de relevancia sale de intersecciones
+        self._postings_nombre = {}
+        self._vocab = []
+        self._terminos = {}
+        self._nombre = {}
+        self._precio = {}
+        self._stock = {}
+
+    # --- mantenimiento ---
+    def build(self, productos, version):
+        """productos: iterable de (id, nombre, descripcion, precio, stock)."""
+        with self._lock:
+            self._postings = {}
+            self._postings_nombre = {}
+            for campo in (self._terminos, self._nombre, self._precio, self._stock):
+                campo.clear()
+            for fila in productos:
+                self._add(*fila)
+            self._vocab = sorted(self._postings)
+            self.version = version
+
+    def refresh(self, product_ids, productos, version):
+        """Reemplaza los documentos de product_ids con las filas dadas (las que
+        falten se borran). No hace nada si el índice ya tiene esa versión: dos
+        requests pueden traer el mismo cambio."""
+        with self._lock:
+            if self.version is not None and version <= self.version:
+                return
+            self.version = version
+            for product_id in product_ids:
+                self._remove(product_id)
+            for fila in productos:
+                self._add(*fila, keep_vocab=True)
+
+    def _add(self, product_id, nombre, descripcion, precio, stock, keep_vocab=False):
+        # Tuplas en vez de sets por documento: con 100k productos la diferencia
+        # de memoria es de cientos de MB.
+        terminos_nombre = tuple(set(tokenize(nombre)))
+        terminos = tuple(set(terminos_nombre).union(tokenize(descripcion)))
+        self._terminos[product_id] = terminos
+        for termino in terminos_nombre:
+            ids = self._postings_nombre.get(termino)
+            if ids is None:
+                self._postings_nombre[termino] = {product_id}
+            else:
+                ids.add(product_id)
+        self._nombre[product_id] = (nombre or '').lower()
+        self._precio[product_id] = float(precio or 0)
+        self._stock[product_id] = stock or 0
+        postings = self._postings
+        for termino in terminos:
+            ids = postings.get(termino)
+            if ids is None:
+                ids = postings[termino] = {product_id}
+                if keep_vocab:
+                    bisect.insort(self._vocab, termino)
+            else:
+                ids.add(product_id)
+
+    def _remove(self, product_id):
+        terminos = self._terminos.pop(product_id, None)
+        if terminos is None:
+            return
+        for campo in (self._nombre, self._precio, self._stock):
+            del campo[product_id]
+        for termino in terminos:
+            en_nombre = self._postings_nombre.get(termino)
+            if en_nombre is not None:
+                en_nombre.discard(product_id)
+                if not en_nombre:
+                    del self._postings_nombre[termino]
+            ids = self._postings.get(termino)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del self._postings[termino]
+                    i = bisect.bisect_left(self._vocab, termino)
+                    if i < len(self._vocab) and self._vocab[i] == termino:
+                        del self._vocab[i]
+
+    # --- consulta ---
+    def _candidatos(self, terminos):
+        # Todos los términos deben aparecer; el último también por prefijo
+        # ("guit" encuentra "guitarra") para búsquedas mientras se escribe.
+        conjuntos = [self._postings.get(t, set()) for t in terminos[:-1]]
+        ultimo = terminos[-1]
+        i = bisect.bisect_left(self._vocab, ultimo)
+        coincidencias = []
+        while i < len(self._vocab) and self._vocab[i].startswith(ultimo):
+            coincidencias.append(self._postings[self._vocab[i]])
+            i += 1
+        prefijo = coincidencias[0] if len(coincidencias) == 1 else set().union(*coincidencias)
+        conjuntos.append(prefijo)
+        conjuntos.sort(key=len)
+        if len(conjuntos) == 1:
+            return conjuntos[0]
+        resultado = conjuntos[0] & conjuntos[1]
+        for ids in conjuntos[2:]:
+            resultado &= ids
+            if not resultado:
+                break
+        return resultado
+
+    def search(self, q, precio_min=None, precio_max=None, en_stock=False, orden='relevancia',
+               page=1, per_page=24):
+        """Devuelve (ids de la página, total de coincidencias)."""
+        terminos = tokenize(q)
+        if not terminos:
+            return [], 0
+        with self._lock:
+            ids = self._candidatos(terminos)
+            precio, stock = self._precio, self._stock
+            if precio_min is not None or precio_max is not None or en_stock:
+                bajo = float('-inf') if precio_min is None else precio_min
+                alto = float('inf') if precio_max is None else precio_max
+                ids = [i for i in ids if bajo <= precio[i] <= alto and (not en_stock or stock[i] > 0)]
+            hasta = page * per_page
+            if orden == 'relevancia':
+                return self._por_relevancia(terminos, ids, hasta)[hasta - per_page:], len(ids)
+            if orden == 'precio_asc':
+                clave = lambda i: (precio[i], i)
+            elif orden == 'precio_desc':
+                clave = lambda i: (-precio[i], i)
+            else:
+                nombre = self._nombre
+                clave = lambda i: (nombre[i], i)
+            # Solo se ordena lo necesario para llegar a la página pedida
+            pagina = heapq.nsmallest(hasta, ids, key=clave)[hasta - per_page:]
+            return pagina, len(ids)
+
+    def _por_relevancia(self, terminos, ids, hasta):
+        """Los primeros `hasta` ids ordenados por términos de la búsqueda en el
+        nombre (más primero) y después por id.
+
+        Los puntajes salen de intersecciones con los postings del nombre (en C);
+        solo se cuentan en Python los candidatos que tienen algún término en el
+        nombre, y solo con más de un término buscado.
+        """
+        ids = ids if isinstance(ids, (set, frozenset)) else set(ids)
+        en_nombre = [ids & self._postings_nombre[t] for t in set(terminos) if t in self._postings_nombre]
+        en_nombre = [s for s in en_nombre if s]
+        if len(en_nombre) <= 1:
+            niveles = en_nombre
+            con_puntaje = en_nombre[0] if en_nombre else set()
+        else:
+            conteo = Counter()
+            for s in en_nombre:
+                conteo.update(s)
+            por_puntaje = defaultdict(list)
+            for product_id, puntaje in conteo.items():
+                por_puntaje[puntaje].append(product_id)
+            niveles = [por_puntaje[p] for p in sorted(por_puntaje, reverse=True)]
+            con_puntaje = conteo.keys()
+        niveles.append(ids - con_puntaje if con_puntaje else ids)
+        pagina = []
+        for nivel in niveles:
+            falta = hasta - len(pagina)
+            if falta <= 0:
+                break
+            pagina += heapq.nsmallest(falta, nivel) if len(nivel) > falta else sorted(nivel)
+        return pagina
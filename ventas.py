@@ -0,0 +1,127 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import select, delete, insert, func, cast, Date, union_all, tuple_
+from models import db, Order, OrderItem, OrderArchive, OrderItemArchive, Product, DailySales
+
+# Resumen de ventas (DailySales) mantenido en la misma transacción que el
+# pedido: checkout suma las líneas en 'Pendiente de envío' y cada cambio de
+# estado mueve las líneas del estado anterior al nuevo. El día es siempre
+# la fecha del pedido, no la del cambio.
+
+def _upsert(filas):
+    """Suma unidades e ingresos a las filas existentes (o las crea)."""
+    tabla = DailySales.__table__
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(tabla)
+        stmt = stmt.on_duplicate_key_update(unidades=tabla.c.unidades + stmt.inserted.unidades,
+                                            ingresos=tabla.c.ingresos + stmt.inserted.ingresos)
+    elif dialecto in ('sqlite', 'postgresql'):
+        if dialecto == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(tabla)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[tabla.c.dia, tabla.c.status, tabla.c.product_id],
+            set_={'unidades': tabla.c.unidades + stmt.excluded.unidades,
+                  'ingresos': tabla.c.ingresos + stmt.excluded.ingresos})
+    else:
+        raise RuntimeError(f'Upsert no soportado para {dialecto}')
+    db.session.execute(stmt, filas)
+
+def _acumular(acumulado, dia, status, product_id, quantity, price, signo):
+    clave = (dia, status, product_id)
+    acumulado[clave][0] += signo * quantity
+    acumulado[clave][1] += signo * quantity * Decimal(price)
+
+def _guardar(acumulado):
+    filas = [{'dia': dia, 'status': status, 'product_id': product_id, 'unidades': unidades, 'ingresos': ingresos}
+             for (dia, status, product_id), (unidades, ingresos) in acumulado.items() if unidades or ingresos]
+    if filas:
+        _upsert(filas)
+    # Las filas que se restaron y quedaron en cero se borran: reconstruir() no
+    # las crea, así el resumen incremental y el recalculado coinciden
+    restadas = [clave for clave, (unidades, ingresos) in acumulado.items() if unidades < 0 or ingresos < 0]
+    if restadas:
+        db.session.execute(delete(DailySales).where(
+            tuple_(DailySales.dia, DailySales.status, DailySales.product_id).in_(restadas),
+            DailySales.unidades == 0, DailySales.ingresos == 0,
+        ))
+
+def registrar_pedido(order, items):
+    """items: [(product_id, quantity, price)] del pedido recién creado."""
+    acumulado = defaultdict(lambda: [0, Decimal(0)])
+    for product_id, quantity, price in items:
+        _acumular(acumulado, order.date.date(), order.status, product_id, quantity, price, 1)
+    _guardar(acumulado)
+
+def mover(cambios, nuevo_status):
+    """cambios: [(order_id, fecha, status anterior)] de pedidos que pasan a nuevo_status."""
+    if not cambios:
+        return
+    anteriores = {order_id: (fecha.date(), status) for order_id, fecha, status in cambios}
+    acumulado = defaultdict(lambda: [0, Decimal(0)])
+    items = db.session.execute(
+        select(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity, OrderItem.price)
+        .where(OrderItem.order_id.in_(list(anteriores)))
+    )
+    for order_id, product_id, quantity, price in items:
+        dia, status = anteriores[order_id]
+        _acumular(acumulado, dia, status, product_id, quantity, price, -1)
+        _acumular(acumulado, dia, nuevo_status, product_id, quantity, price, 1)
+    _guardar(acumulado)
+
+def reconstruir():
+    """Vacía y recalcula DailySales desde los pedidos y el archivo (un INSERT ... SELECT)."""
+    lineas = union_all(*[
+        select(pedido.date, pedido.status, item.product_id, item.quantity, item.price)
+        .join(item, item.order_id == pedido.id)
+        for pedido, item in ((Order, OrderItem), (OrderArchive, OrderItemArchive))
+    ]).subquery()
+    dia = cast(lineas.c.date, Date) if db.session.get_bind().dialect.name != 'sqlite' else func.date(lineas.c.date)
+    agregado = select(
+        dia, lineas.c.status, lineas.c.product_id,
+        func.sum(lineas.c.quantity), func.sum(lineas.c.price * lineas.c.quantity),
+    ).group_by(dia, lineas.c.status, lineas.c.product_id)
+    db.session.execute(delete(DailySales))
+    db.session.execute(insert(DailySales).from_select(
+        ['dia', 'status', 'product_id', 'unidades', 'ingresos'], agregado))
+    db.session.commit()
+    return db.session.query(func.count()).select_from(DailySales).scalar()
+
+# --- KPIs ---
+
+def kpis(dias=30, top=5):
+    """Ingresos y unidades (sin cancelados) de hoy y de los últimos días, y productos más vendidos.
+
+    Solo lee el rango de días pedido: el costo depende de días x productos,
+    no de la cantidad de pedidos.
+    """
+    vendidos = DailySales.status != 'Cancelado'
+    # Los días del resumen salen de Order.date, que se guarda en UTC
+    hoy = datetime.utcnow().date()
+    desde = hoy - timedelta(days=dias - 1)
+
+    def totales(inicio):
+        unidades, ingresos = db.session.query(
+            func.coalesce(func.sum(DailySales.unidades), 0), func.coalesce(func.sum(DailySales.ingresos), 0)
+        ).filter(DailySales.dia >= inicio, vendidos).one()
+        return {'unidades': int(unidades), 'ingresos': Decimal(ingresos)}
+
+    unidades = func.sum(DailySales.unidades).label('unidades')
+    top_productos = db.session.query(
+        DailySales.product_id, Product.nombre, unidades, func.sum(DailySales.ingresos).label('ingresos')
+    ).outerjoin(Product, Product.id == DailySales.product_id) \
+        .filter(DailySales.dia >= desde, vendidos) \
+        .group_by(DailySales.product_id, Product.nombre) \
+        .order_by(unidades.desc()).limit(top).all()
+
+    return {
+        'dias': dias,
+        'hoy': totales(hoy),
+        'periodo': totales(desde),
+        'top': top_productos,
+    }
@@ -0,0 +1,15 @@
+"""Punto de entrada WSGI para producción:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+La configuración se toma del entorno (DATABASE_URL, SECRET_KEY, DB_POOL_*,
+MELODIAS_<CLAVE>; ver config.py). python app.py sigue siendo solo para desarrollo.
+SECRET_KEY es obligatoria: sin ella cualquiera podría firmar cookies de sesión.
+"""
+from app import app
+from config import SECRET_KEY_DESARROLLO
+
+if app.config.get('SECRET_KEY') in (None, '', SECRET_KEY_DESARROLLO):
+    raise RuntimeError('Falta SECRET_KEY en el entorno: en producción no se usa la clave de desarrollo.')
+
+application = app